@@ -0,0 +1,85 @@
+"""Compare scalar and batch threshold evaluation on a long route.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_commute_evaluator --points 1000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from models.thresholds import WeatherLimits
+from services.commute_evaluator import (
+    evaluate_detailed_thresholds,
+    evaluate_detailed_thresholds_batch,
+)
+
+FIELDS = ("wind_speed", "wind_deg", "rain", "humidity", "temp", "visibility", "uvi")
+
+
+def _weathers(n: int, seed: int):
+    rng = random.Random(seed)
+    return [
+        {
+            "wind_speed": rng.uniform(0, 12),
+            "wind_deg": rng.uniform(0, 360),
+            "rain": rng.uniform(0, 3),
+            "humidity": rng.uniform(40, 100),
+            "temp": rng.uniform(-2, 32),
+            "visibility": rng.choice([1000, 5000, 10000]),
+            "uvi": rng.uniform(0, 9),
+        }
+        for _ in range(n)
+    ], [rng.uniform(0, 360) for _ in range(n)]
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    limits = WeatherLimits(
+        max_wind_speed=8,
+        max_rain_intensity=2,
+        max_humidity=85,
+        min_temperature=4,
+        max_temperature=26,
+        min_visibility=3000,
+        max_uv_index=6,
+    )
+    weathers, bearings = _weathers(args.points, args.seed)
+
+    scalar = _best_of(
+        args.repeat,
+        lambda: [
+            evaluate_detailed_thresholds(w, limits, b) for w, b in zip(weathers, bearings)
+        ],
+    )
+    # Building the columns is part of the batch path's cost.
+    batch = _best_of(
+        args.repeat,
+        lambda: evaluate_detailed_thresholds_batch(
+            {f: [w[f] for w in weathers] for f in FIELDS}, limits, bearings
+        ),
+    )
+    print(f"points:  {args.points}")
+    print(f"scalar:  {scalar * 1000:8.2f} ms")
+    print(f"batch:   {batch * 1000:8.2f} ms")
+    print(f"speedup: {scalar / batch:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
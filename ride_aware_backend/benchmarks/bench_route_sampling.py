@@ -0,0 +1,60 @@
+"""Compare the segment-walk and NumPy route samplers on a long GPS trace.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_route_sampling --points 10000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from models.wind import Coordinate
+from services.wind_service import sample_route_arrays, sample_route_points
+
+
+def _trace(n: int, seed: int):
+    rng = random.Random(seed)
+    lat, lon = 51.45, -2.6
+    lats, lons = [], []
+    for _ in range(n):
+        lat += rng.uniform(-1e-4, 1.5e-4)
+        lon += rng.uniform(-1e-4, 1.5e-4)
+        lats.append(lat)
+        lons.append(lon)
+    return lats, lons
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    lats, lons = _trace(args.points, args.seed)
+    coords = [Coordinate(lat=a, lon=b) for a, b in zip(lats, lons)]
+
+    samples = len(sample_route_points(coords))
+    loop = _best_of(args.repeat, lambda: sample_route_points(coords))
+    # Array conversion from plain floats is part of the NumPy path's cost.
+    arrays = _best_of(args.repeat, lambda: sample_route_arrays(lats, lons))
+    print(f"points:  {args.points}")
+    print(f"samples: {samples}")
+    print(f"loop:    {loop * 1000:8.2f} ms")
+    print(f"numpy:   {arrays * 1000:8.2f} ms")
+    print(f"speedup: {loop / arrays:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Measure point reduction and route evaluation latency with simplification.
+
+Builds a synthetic 1 Hz GPS commute trace (a random-walk heading with a few
+metres of jitter) and, for each tolerance, times request validation,
+simplification and route weather evaluation end to end. Forecasts come from
+the synthetic provider, parsed in-process, so no network or Mongo is needed.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_route_simplify --minutes 40
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import random
+import time
+from datetime import datetime, timezone
+
+from routes.forecast import RouteForecastRequest
+from services import route_weather_service
+from services.forecast_series import ForecastSeries
+from services.route_geometry import simplify_points
+from services.weather_providers import SyntheticProvider
+from services.weather_service import FORECAST_SLOTS, _parse_slot
+
+SPEED_MPS = 5.0
+METRES_PER_DEG = 111_320.0
+
+
+def _trace(minutes: int, seed: int):
+    rng = random.Random(seed)
+    lat, lon, heading = 51.45, -2.6, rng.uniform(0, 360)
+    points = []
+    for second in range(minutes * 60):
+        # Mostly straight roads, with an occasional junction.
+        if rng.random() < 0.01:
+            heading += rng.choice([-90, 90])
+        heading += rng.gauss(0, 1.5)
+        lat += SPEED_MPS * math.cos(math.radians(heading)) / METRES_PER_DEG
+        lon += (
+            SPEED_MPS
+            * math.sin(math.radians(heading))
+            / (METRES_PER_DEG * math.cos(math.radians(lat)))
+        )
+        points.append(
+            {
+                "latitude": lat + rng.gauss(0, 2) / METRES_PER_DEG,
+                "longitude": lon + rng.gauss(0, 2) / METRES_PER_DEG,
+            }
+        )
+    return points
+
+
+def _install_synthetic_forecasts(seed: int) -> None:
+    provider = SyntheticProvider(seed=seed)
+
+    async def forecast(lat, lon, when, priority=None):
+        items = await provider.fetch_forecast(lat, lon, FORECAST_SLOTS)
+        series = ForecastSeries.from_records(_parse_slot(item) for item in items)
+        return series.at(when)
+
+    route_weather_service.get_hourly_forecast = forecast
+
+
+async def _run(body: dict, tolerance: float):
+    req = RouteForecastRequest.model_validate(body)
+    pts = [p.model_dump() for p in req.points]
+    if tolerance:
+        pts = simplify_points(pts, tolerance)
+    await route_weather_service.evaluate_route_weather(pts, req.time, req.thresholds)
+    return len(pts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--tolerances", type=float, nargs="+", default=[0, 2, 5, 10, 25]
+    )
+    args = parser.parse_args()
+
+    _install_synthetic_forecasts(args.seed)
+    points = _trace(args.minutes, args.seed)
+    body = {
+        "points": points,
+        "time": datetime.now(timezone.utc).isoformat(),
+        "thresholds": {
+            "max_wind_speed": 8,
+            "max_rain_intensity": 2,
+            "max_humidity": 85,
+            "min_temperature": 4,
+            "max_temperature": 26,
+        },
+    }
+
+    print(f"trace: {len(points)} points over {args.minutes} min")
+    print(f"{'tol m':>6} {'points':>7} {'kept':>6} {'latency ms':>11}")
+    for tolerance in args.tolerances:
+        best = float("inf")
+        kept = 0
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            kept = asyncio.run(_run(body, tolerance))
+            best = min(best, time.perf_counter() - started)
+        print(
+            f"{tolerance:6.0f} {kept:7d} {kept / len(points):6.1%} {best * 1000:11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,55 @@
 from dotenv import load_dotenv
 import os
+import socket
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+
+OPENWEATHER_TIMEOUT_S = float(os.getenv("OPENWEATHER_TIMEOUT_S", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+FORECAST_GRID_DEG = float(os.getenv("FORECAST_GRID_DEG", "0.01"))
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "1024"))
+FORECAST_RUN_HOURS = int(os.getenv("FORECAST_RUN_HOURS", "3"))
+
+OPENWEATHER_RATE_PER_S = float(os.getenv("OPENWEATHER_RATE_PER_S", "1"))
+OPENWEATHER_BURST = int(os.getenv("OPENWEATHER_BURST", "10"))
+OPENWEATHER_QUEUE_SIZE = int(os.getenv("OPENWEATHER_QUEUE_SIZE", "100"))
+
+FORECAST_BREAKER_FAILURES = int(os.getenv("FORECAST_BREAKER_FAILURES", "5"))
+FORECAST_BREAKER_RESET_S = float(os.getenv("FORECAST_BREAKER_RESET_S", "30"))
+FORECAST_MAX_STALE_S = float(os.getenv("FORECAST_MAX_STALE_S", str(6 * 3600)))
+
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "openweather")
+WEATHER_RECORDINGS = os.getenv("WEATHER_RECORDINGS", "recordings")
+WEATHER_SYNTHETIC_SEED = int(os.getenv("WEATHER_SYNTHETIC_SEED", "0"))
+WEATHER_SYNTHETIC_LATENCY_MS = float(os.getenv("WEATHER_SYNTHETIC_LATENCY_MS", "0"))
+
+ROUTE_FETCH_CONCURRENCY = int(os.getenv("ROUTE_FETCH_CONCURRENCY", "16"))
+ROUTE_DEADLINE_S = float(os.getenv("ROUTE_DEADLINE_S", "8"))
+ROUTE_SPEED_KMH = float(os.getenv("ROUTE_SPEED_KMH", "18"))
+ROUTE_SIMPLIFY_TOLERANCE_M = float(os.getenv("ROUTE_SIMPLIFY_TOLERANCE_M", "10"))
+
+WIND_FETCH_CONCURRENCY = int(os.getenv("WIND_FETCH_CONCURRENCY", "8"))
+WIND_DEADLINE_S = float(os.getenv("WIND_DEADLINE_S", "8"))
+WIND_SAMPLE_SPACING_M = float(os.getenv("WIND_SAMPLE_SPACING_M", "1000"))
+WIND_CACHE_SIZE = int(os.getenv("WIND_CACHE_SIZE", "4096"))
+WIND_CACHE_TTL_S = float(os.getenv("WIND_CACHE_TTL_S", "300"))
+WIND_RECORD_BATCH_SIZE = int(os.getenv("WIND_RECORD_BATCH_SIZE", "100"))
+WIND_RECORD_FLUSH_S = float(os.getenv("WIND_RECORD_FLUSH_S", "5"))
+WIND_RECORD_RETENTION_DAYS = int(os.getenv("WIND_RECORD_RETENTION_DAYS", "30"))
+
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S", "30"))
+JOB_MAX_LATENESS_S = float(os.getenv("JOB_MAX_LATENESS_S", "3600"))
+JOB_CLAIM_BATCH = int(os.getenv("JOB_CLAIM_BATCH", "1000"))
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "32"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "300"))
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+NOTIFICATION_SENDER = os.getenv("NOTIFICATION_SENDER", "log")
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "500"))
+FCM_TOKEN_CACHE_SIZE = int(os.getenv("FCM_TOKEN_CACHE_SIZE", "10000"))
+FCM_TOKEN_CACHE_TTL_S = float(os.getenv("FCM_TOKEN_CACHE_TTL_S", "300"))
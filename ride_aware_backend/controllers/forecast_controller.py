@@ -1,19 +1,19 @@
 import logging
 from datetime import datetime
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 from services.weather_service import (
     get_hourly_forecast,
     get_next_hours_forecast,
+    forecast_stats,
 )
-from services.route_weather_service import evaluate_route_weather
-from services.forecast_cache_service import save_hourly_forecasts
+from services.route_weather_service import evaluate_route_weather, stream_route_weather
 from models.thresholds import WeatherLimits
 
 logger = logging.getLogger(__name__)
 
 async def get_forecast(lat: float, lon: float, time: datetime) -> dict:
     logger.info("Getting forecast for lat=%s lon=%s at %s", lat, lon, time)
-    return get_hourly_forecast(lat, lon, time)
+    return await get_hourly_forecast(lat, lon, time)
 
 
 async def get_next_hours(lat: float, lon: float, hours: int) -> list:
@@ -23,13 +23,33 @@ async def get_next_hours(lat: float, lon: float, hours: int) -> list:
         lat,
         lon,
     )
-    data = get_next_hours_forecast(lat, lon, hours)
-    await save_hourly_forecasts(lat, lon, data)
-    return data
+    return await get_next_hours_forecast(lat, lon, hours)
 
 
 async def evaluate_route(
-    points: List[Dict[str, float]], time: datetime, thresholds: WeatherLimits
+    points: List[Dict[str, float]],
+    time: datetime,
+    thresholds: WeatherLimits,
+    speed_kmh: Optional[float] = None,
 ) -> dict:
-    logger.info("Evaluating route with %s points at %s", len(points), time)
-    return evaluate_route_weather(points, time, thresholds)
+    logger.info(
+        "Evaluating route with %s points at %s (speed %s km/h)",
+        len(points),
+        time,
+        speed_kmh,
+    )
+    return await evaluate_route_weather(points, time, thresholds, speed_kmh=speed_kmh)
+
+
+def stream_route(
+    points: List[Dict[str, float]],
+    time: datetime,
+    thresholds: WeatherLimits,
+    speed_kmh: Optional[float] = None,
+) -> AsyncIterator[dict]:
+    logger.info("Streaming route evaluation with %s points at %s", len(points), time)
+    return stream_route_weather(points, time, thresholds, speed_kmh=speed_kmh)
+
+
+async def get_forecast_stats() -> dict:
+    return forecast_stats()
@@ -2,6 +2,7 @@ import logging
 from fastapi import HTTPException
 from models.route import RouteModel
 from services.db import routes_collection
+from services.route_geometry import build_route_summary, is_current_summary, points_hash
 from pymongo.errors import PyMongoError
 
 
@@ -10,9 +11,24 @@ logger = logging.getLogger(__name__)
 
 async def save_user_route(route: RouteModel):
     try:
+        doc = route.model_dump(mode='json')
+        existing = await routes_collection.find_one(
+            {"device_id": route.device_id}, {"geometry": 1}
+        )
+        # Geometry is only rebuilt when the polyline itself changed.
+        if not is_current_summary(
+            (existing or {}).get("geometry"), points_hash(doc["route_points"])
+        ):
+            doc["geometry"] = build_route_summary(doc["route_points"])
+            logger.debug(
+                "Route geometry rebuilt for %s: %.0f m, %s samples",
+                route.device_id,
+                doc["geometry"]["total_m"],
+                len(doc["geometry"]["samples"]),
+            )
         await routes_collection.update_one(
             {"device_id": route.device_id},
-            {"$set": route.model_dump(mode='json')},
+            {"$set": doc},
             upsert=True,
         )
         logger.info("Route upserted for device %s", route.device_id)
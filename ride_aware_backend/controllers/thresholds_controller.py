@@ -8,6 +8,8 @@ from services.db import thresholds_collection
 from controllers.feedback_controller import create_feedback_entry
 from controllers.ride_history_controller import create_history_entry
 from services.alert_service import schedule_pre_route_alert, schedule_feedback_reminder
+from services.job_scheduler import job_scheduler
+from services.notification_service import notification_stats
 
 logger = logging.getLogger(__name__)
 
@@ -38,8 +40,8 @@ async def upsert_threshold(threshold: Thresholds) -> dict:
 
     await create_feedback_entry(device_id, threshold_id_str)
     await create_history_entry(device_id, threshold_id_str, date, start_time, end_time, data)
-    await schedule_pre_route_alert(threshold)
-    await schedule_feedback_reminder(threshold)
+    await schedule_pre_route_alert(threshold, threshold_id_str)
+    await schedule_feedback_reminder(threshold, threshold_id_str)
 
     return {
         "device_id": device_id,
@@ -90,3 +92,20 @@ async def get_current_threshold(device_id: str) -> dict:
     payload = Thresholds(**doc).model_dump(mode="json")
     payload["threshold_id"] = threshold_id
     return payload
+
+
+async def get_device_jobs(device_id: str) -> dict:
+    counts = (await job_scheduler.pending_counts(device_id)).get(device_id, {})
+    return {"device_id": device_id, "pending": sum(counts.values()), "by_kind": counts}
+
+
+async def get_job_stats() -> dict:
+    counts = await job_scheduler.pending_counts()
+    per_device = [sum(kinds.values()) for kinds in counts.values()]
+    return {
+        **job_scheduler.stats(),
+        "pending": sum(per_device),
+        "devices_with_pending": len(per_device),
+        "max_pending_per_device": max(per_device, default=0),
+        "notifications": notification_stats(),
+    }
@@ -2,11 +2,22 @@ import logging
 from typing import List
 
 from models.wind import RouteRequest, WindResult
-from services.wind_service import compute_wind_directions as compute_wind_directions_service
+from services.wind_service import (
+    compute_wind_directions as compute_wind_directions_service,
+    wind_stats,
+)
 
 logger = logging.getLogger(__name__)
 
 
 async def compute_wind_directions(req: RouteRequest) -> List[WindResult]:
-    logger.info("Computing wind directions for %s points", len(req.points))
+    logger.info(
+        "Computing wind directions for %s points (device %s)",
+        len(req.points),
+        req.device_id,
+    )
     return await compute_wind_directions_service(req)
+
+
+async def get_wind_stats() -> dict:
+    return wind_stats()
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routes import (
     thresholds,
@@ -13,6 +15,9 @@ from routes import (
 )
 from services.db import init_db
 from services.alert_service import schedule_existing_alerts
+from services.job_scheduler import job_scheduler
+from services.http_client import start_http_client, close_http_client
+from services.wind_service import wind_record_writer
 
 
 logging.basicConfig(
@@ -21,7 +26,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_http_client()
+    await init_db()
+    await job_scheduler.start()
+    # Jobs are durable; back-filling older thresholds must not hold up startup.
+    backfill = asyncio.create_task(schedule_existing_alerts())
+    wind_record_writer.start()
+    yield
+    backfill.cancel()
+    await job_scheduler.stop()
+    await wind_record_writer.stop()
+    await close_http_client()
+
+
+app = FastAPI(lifespan=lifespan)
 logger.info("FastAPI application initialized")
 app.include_router(thresholds.router)
 app.include_router(routes.router)
@@ -32,9 +53,3 @@ app.include_router(feedback.router)
 app.include_router(ride_history.router)
 app.include_router(wind.router)
 app.include_router(weather_history.router)
-
-
-@app.on_event("startup")
-async def startup_event():
-    await init_db()
-    await schedule_existing_alerts()
@@ -9,7 +9,14 @@ class Coordinate(BaseModel):
 
 class RouteRequest(BaseModel):
     points: List[Coordinate] = Field(
-        ..., description="List of route coordinates (latitude & longitude)"
+        default_factory=list,
+        description="List of route coordinates (latitude & longitude)",
+    )
+    device_id: Optional[str] = Field(
+        None, description="Use this device's saved route and its stored samples"
+    )
+    simplify_tolerance_m: Optional[float] = Field(
+        None, ge=0, le=1000, description="Simplify the posted points before sampling"
     )
 
 
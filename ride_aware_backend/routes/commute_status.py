@@ -2,7 +2,8 @@ import logging
 
 from fastapi import APIRouter, HTTPException
 from controllers.commute_status_controller import get_status
-from services.weather_service import MissingAPIKeyError
+from services.weather_service import MissingAPIKeyError, ForecastUnavailableError
+from services.upstream_scheduler import UpstreamShedError
 
 
 logger = logging.getLogger(__name__)
@@ -20,6 +21,9 @@ async def commute_status(device_id: str):
     except MissingAPIKeyError as e:
         logger.error("Weather service configuration error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    except (UpstreamShedError, ForecastUnavailableError) as e:
+        logger.warning("Weather unavailable for %s: %s", device_id, e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception:
         logger.exception("Unexpected error retrieving commute status for %s", device_id)
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -2,6 +2,7 @@ import logging
 from fastapi import APIRouter
 from models.fcm import FCMDeviceModel
 from services.db import fcm_tokens_collection
+from services.notification_service import invalidate_token
 
 
 logger = logging.getLogger(__name__)
@@ -16,6 +17,7 @@ async def register_fcm_token(data: FCMDeviceModel):
         {"$set": {"fcm_token": data.fcm_token}},
         upsert=True,
     )
+    invalidate_token(data.device_id)
     logger.debug("FCM token stored for device %s", data.device_id)
     return {"status": "success", "message": "FCM token registered."}
 
@@ -1,15 +1,22 @@
+import json
 import logging
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, List, Literal, Optional
 from controllers.forecast_controller import (
     get_forecast,
     evaluate_route,
+    stream_route,
     get_next_hours,
+    get_forecast_stats,
 )
-from services.weather_service import MissingAPIKeyError
+from services.weather_service import MissingAPIKeyError, ForecastUnavailableError
+from services.upstream_scheduler import UpstreamShedError
 from models.thresholds import WeatherLimits
+from config import ROUTE_SPEED_KMH
+from services.route_geometry import simplify_points
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["Forecast"])
@@ -22,6 +29,9 @@ async def forecast(lat: float, lon: float, time: datetime):
     except MissingAPIKeyError as e:
         logger.error("Weather service configuration error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    except (UpstreamShedError, ForecastUnavailableError) as e:
+        logger.warning("Forecast unavailable: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception:
         logger.exception("Unexpected error retrieving forecast")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -37,11 +47,19 @@ async def forecast_next(lat: float, lon: float, hours: int = 6):
     except MissingAPIKeyError as e:
         logger.error("Weather service configuration error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    except (UpstreamShedError, ForecastUnavailableError) as e:
+        logger.warning("Forecast unavailable: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception:
         logger.exception("Unexpected error retrieving forecast")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/forecast/stats")
+async def forecast_stats():
+    return await get_forecast_stats()
+
+
 class _Point(BaseModel):
     latitude: float
     longitude: float
@@ -51,17 +69,67 @@ class RouteForecastRequest(BaseModel):
     points: List[_Point]
     time: datetime
     thresholds: WeatherLimits
+    # Evaluate each point at its estimated pass time instead of at ``time``.
+    time_aware: bool = False
+    speed_kmh: Optional[float] = Field(default=None, gt=0, le=100)
+    # Drop points within this many metres of the simplified line first.
+    simplify_tolerance_m: Optional[float] = Field(default=None, ge=0, le=1000)
+
+    def pass_speed(self) -> Optional[float]:
+        if self.speed_kmh is not None:
+            return self.speed_kmh
+        return ROUTE_SPEED_KMH if self.time_aware else None
+
+
+_STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def _encode_record(record: dict, fmt: str) -> str:
+    data = json.dumps(record, default=str)
+    if fmt == "sse":
+        return f"event: {record.get('type', 'message')}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def _stream_records(
+    first: dict, records: AsyncIterator[dict], fmt: str
+) -> AsyncIterator[str]:
+    yield _encode_record(first, fmt)
+    try:
+        async for record in records:
+            yield _encode_record(record, fmt)
+    except Exception as e:
+        # Headers are already sent; report the failure in-band.
+        logger.exception("Route forecast stream failed")
+        yield _encode_record({"type": "error", "detail": str(e)}, fmt)
 
 
 @router.post("/forecast/route")
-async def forecast_route(req: RouteForecastRequest):
+async def forecast_route(
+    req: RouteForecastRequest,
+    stream: Optional[Literal["ndjson", "sse"]] = Query(default=None),
+):
     logger.info("Route forecast request with %s points", len(req.points))
     try:
         pts = [p.dict() for p in req.points]
-        return await evaluate_route(pts, req.time, req.thresholds)
+        if req.simplify_tolerance_m:
+            pts = simplify_points(pts, req.simplify_tolerance_m)
+            logger.debug("Route simplified from %s to %s points", len(req.points), len(pts))
+        if stream is None:
+            return await evaluate_route(pts, req.time, req.thresholds, req.pass_speed())
+        records = stream_route(pts, req.time, req.thresholds, req.pass_speed())
+        # Pull the first record here so early failures still map to a status code.
+        first = await records.__anext__()
+        return StreamingResponse(
+            _stream_records(first, records, stream),
+            media_type=_STREAM_MEDIA_TYPES[stream],
+        )
     except MissingAPIKeyError as e:
         logger.error("Weather service configuration error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    except (UpstreamShedError, ForecastUnavailableError) as e:
+        logger.warning("Forecast unavailable: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception:
         logger.exception("Unexpected error retrieving route forecast")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -5,6 +5,8 @@ from controllers.thresholds_controller import (
     upsert_threshold,
     get_thresholds,
     get_current_threshold,
+    get_device_jobs,
+    get_job_stats,
 )
 
 router = APIRouter()
@@ -20,6 +22,16 @@ async def post_thresholds(payload: Thresholds):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/thresholds/jobs/stats")
+async def job_stats():
+    return await get_job_stats()
+
+
+@router.get("/thresholds/{device_id}/jobs")
+async def device_jobs(device_id: str):
+    return await get_device_jobs(device_id)
+
+
 @router.get("/thresholds/{device_id}")
 async def get_current(device_id: str):
     return await get_current_threshold(device_id)
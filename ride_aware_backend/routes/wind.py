@@ -3,7 +3,7 @@ from typing import List
 
 from fastapi import APIRouter
 
-from controllers.wind_controller import compute_wind_directions
+from controllers.wind_controller import compute_wind_directions, get_wind_stats
 from models.wind import RouteRequest, WindResult
 
 logger = logging.getLogger(__name__)
@@ -14,3 +14,8 @@ router = APIRouter(tags=["Wind"])
 async def wind_directions(route: RouteRequest):
     logger.info("Wind directions request with %s points", len(route.points))
     return await compute_wind_directions(route)
+
+
+@router.get("/wind-directions/stats")
+async def wind_directions_stats():
+    return await get_wind_stats()
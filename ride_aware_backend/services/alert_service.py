@@ -3,88 +3,194 @@ from __future__ import annotations
 import asyncio
 import logging
 from datetime import datetime, timedelta, date
+from typing import Any, Dict, List, Optional, Tuple
 from zoneinfo import ZoneInfo
 
+from config import FORECAST_GRID_DEG
 from models.thresholds import Thresholds
-from services.db import fcm_tokens_collection, thresholds_collection
+from services.db import thresholds_collection
+from services.job_scheduler import job_scheduler
+from services.notification_service import send_notifications
 from services.weather_service import get_next_hours_forecast
-from services.threshold_eval import evaluate_forecast_point, summarize_breaches
+from services.upstream_scheduler import Priority
+from services.threshold_eval import evaluate_forecast_batch, summarize_breaches
 from utils.commute_window import parse_time
+from utils.forecast_grid import grid_cell
 
 logger = logging.getLogger(__name__)
 
+# Jobs inserted per bulk write when back-filling at startup.
+_BACKFILL_BATCH = 1000
 
-async def _send_notification(device_id: str, message: str) -> None:
-    doc = await fcm_tokens_collection.find_one({"device_id": device_id})
-    token = doc.get("fcm_token") if doc else None
-    if token:
-        logger.info("Would send notification to %s: %s", device_id, message)
-    else:
-        logger.warning("No FCM token for %s; skipping notification", device_id)
+FINE_MESSAGE = "Conditions look fine for your ride."
 
 
-async def _check_and_notify(threshold: Thresholds) -> None:
+async def _alert_messages(thresholds: List[Thresholds]) -> List[str]:
+    """Alert text for riders whose offices share a forecast grid cell."""
+    office = thresholds[0].office_location
+    forecasts = await get_next_hours_forecast(
+        float(office.latitude), float(office.longitude), 6, priority=Priority.ALERT
+    )
+    limits = [t.weather_limits.model_dump() for t in thresholds]
+    return [
+        summarize_breaches(breaches) or FINE_MESSAGE
+        for breaches in evaluate_forecast_batch(forecasts, limits)
+    ]
 
-    device_id = threshold.device_id
-    lat = float(threshold.office_location.latitude)
-    lon = float(threshold.office_location.longitude)
-    forecasts = get_next_hours_forecast(lat, lon, 6)
-    limits = threshold.weather_limits.model_dump() if hasattr(threshold, "weather_limits") else {}
-    breaches_per_hour = [evaluate_forecast_point(f, limits) for f in forecasts]
-    message = summarize_breaches(breaches_per_hour)
-    if message:
-        await _send_notification(device_id, message)
-    else:
-        await _send_notification(device_id, "Conditions look fine for your ride.")
 
+PRE_ROUTE_ALERT = "pre_route_alert"
+FEEDBACK_REMINDER = "feedback_reminder"
+FEEDBACK_MESSAGE = (
+    "How was your ride? Please share quick feedback to improve your route tips."
+)
 
-async def schedule_pre_route_alert(threshold: Thresholds) -> None:
 
+def _ride_datetime(threshold: Thresholds, time_str: str) -> datetime:
     tz_name = getattr(threshold, "timezone", None) or datetime.now().astimezone().tzinfo.key
-    tz = ZoneInfo(tz_name)
     ride_date = date.fromisoformat(threshold.date)
-    start_dt = datetime.combine(ride_date, parse_time(threshold.start_time), tzinfo=tz)
-    alert_dt = start_dt - timedelta(hours=3)
+    return datetime.combine(ride_date, parse_time(time_str), tzinfo=ZoneInfo(tz_name))
 
-    async def worker():
-        now = datetime.now(tz)
-        delay = (alert_dt - now).total_seconds()
-        if delay > 0:
-            await asyncio.sleep(delay)
-        await _check_and_notify(threshold)
 
-    asyncio.create_task(worker())
+_THRESHOLD_KEY = ("device_id", "date", "start_time", "end_time")
 
 
-async def schedule_feedback_reminder(threshold: Thresholds) -> None:
+def _job_id(kind: str, threshold: Thresholds, threshold_id: Optional[str]) -> str:
+    if threshold_id:
+        return f"{kind}:{threshold_id}"
+    return f"{kind}:{threshold.device_id}:{threshold.date}:{threshold.start_time}:{threshold.end_time}"
 
-    tz_name = getattr(threshold, "timezone", None) or datetime.now().astimezone().tzinfo.key
-    tz = ZoneInfo(tz_name)
-    ride_date = date.fromisoformat(threshold.date)
-    end_dt = datetime.combine(
-        ride_date, parse_time(threshold.end_time), tzinfo=tz
+
+def _job_fields(threshold: Thresholds, threshold_id: Optional[str]) -> Dict[str, Any]:
+    return {"threshold_id": threshold_id, **{k: getattr(threshold, k) for k in _THRESHOLD_KEY}}
+
+
+async def _schedule(
+    kind: str, threshold: Thresholds, fire_at: datetime, threshold_id: Optional[str]
+) -> None:
+    # One job per kind and threshold: scheduling again moves that job (or
+    # leaves it alone if the time is unchanged) and cancels any other
+    # pending job for the same threshold, so repeated upserts never pile
+    # up alerts. The job only references the threshold; the handler
+    # reloads it so an edit is evaluated as it stands when the job fires.
+    job_id = _job_id(kind, threshold, threshold_id)
+    fields = _job_fields(threshold, threshold_id)
+    await job_scheduler.schedule(kind, job_id, fire_at, **fields)
+    key = {k: fields[k] for k in _THRESHOLD_KEY}
+    await job_scheduler.cancel({"kind": kind, "_id": {"$ne": job_id}, **key})
+
+
+async def _load_thresholds(jobs: List[Dict[str, Any]]) -> Dict[str, Thresholds]:
+    """Current thresholds for ``jobs`` in one query, keyed by job id.
+
+    Jobs whose threshold has since been deleted are left out.
+    """
+    keys = [{k: job[k] for k in _THRESHOLD_KEY} for job in jobs]
+    found = {}
+    async for doc in thresholds_collection.find({"$or": keys}):
+        doc.pop("_id", None)
+        found[tuple(doc[k] for k in _THRESHOLD_KEY)] = Thresholds(**doc)
+    out = {}
+    for job in jobs:
+        threshold = found.get(tuple(job[k] for k in _THRESHOLD_KEY))
+        if threshold is None:
+            logger.info("Threshold for job %s no longer exists; skipping", job["_id"])
+        else:
+            out[job["_id"]] = threshold
+    return out
+
+
+async def _run_pre_route_alerts(jobs: List[Dict[str, Any]]) -> Dict[str, Exception]:
+    # One forecast and one vectorised evaluation per office grid cell, so a
+    # busy tick costs a fetch per location rather than per rider.
+    thresholds = await _load_thresholds(jobs)
+    cells: Dict[Any, List[str]] = {}
+    for job_id, threshold in thresholds.items():
+        office = threshold.office_location
+        cell = grid_cell(float(office.latitude), float(office.longitude), FORECAST_GRID_DEG)
+        cells.setdefault(cell, []).append(job_id)
+    groups = list(cells.values())
+    results = await asyncio.gather(
+        *(_alert_messages([thresholds[j] for j in group]) for group in groups),
+        return_exceptions=True,
     )
-    reminder_dt = end_dt + timedelta(hours=1)
-
-    async def worker():
-        now = datetime.now(tz)
-        delay = (reminder_dt - now).total_seconds()
-        if delay > 0:
-            await asyncio.sleep(delay)
-        await _send_notification(
-            threshold.device_id,
-            "How was your ride? Please share quick feedback to improve your route tips.",
+    failures: Dict[str, Exception] = {}
+    messages: Dict[str, Tuple[str, str]] = {}
+    for group, result in zip(groups, results):
+        if isinstance(result, Exception):
+            failures.update((job_id, result) for job_id in group)
+            continue
+        messages.update(
+            (job_id, (thresholds[job_id].device_id, message))
+            for job_id, message in zip(group, result)
         )
+    # Sent before returning, so a job is only marked done once its alert
+    # has gone out; a failed send fails the job instead.
+    failures.update(await send_notifications(messages))
+    return failures
+
+
+async def _run_feedback_reminders(jobs: List[Dict[str, Any]]) -> Dict[str, Exception]:
+    thresholds = await _load_thresholds(jobs)
+    return await send_notifications(
+        {job_id: (t.device_id, FEEDBACK_MESSAGE) for job_id, t in thresholds.items()}
+    )
 
-    asyncio.create_task(worker())
+
+job_scheduler.register(PRE_ROUTE_ALERT, _run_pre_route_alerts, batch=True)
+job_scheduler.register(FEEDBACK_REMINDER, _run_feedback_reminders, batch=True)
+
+
+def _pre_route_alert_at(threshold: Thresholds) -> datetime:
+    return _ride_datetime(threshold, threshold.start_time) - timedelta(hours=3)
+
+
+def _feedback_reminder_at(threshold: Thresholds) -> datetime:
+    return _ride_datetime(threshold, threshold.end_time) + timedelta(hours=1)
+
+
+async def schedule_pre_route_alert(
+    threshold: Thresholds, threshold_id: Optional[str] = None
+) -> None:
+
+    await _schedule(PRE_ROUTE_ALERT, threshold, _pre_route_alert_at(threshold), threshold_id)
+
+
+async def schedule_feedback_reminder(
+    threshold: Thresholds, threshold_id: Optional[str] = None
+) -> None:
+
+    await _schedule(
+        FEEDBACK_REMINDER, threshold, _feedback_reminder_at(threshold), threshold_id
+    )
 
 
 async def schedule_existing_alerts() -> None:
+    """Make sure every upcoming threshold has its jobs.
 
+    Jobs persist across restarts, so this only fills in thresholds saved
+    before the job store existed. It runs in the background at startup
+    and inserts the missing jobs in bulk, leaving existing ones alone.
+    """
     today = date.today().isoformat()
-    cursor = thresholds_collection.find({"date": {"$gte": today}})
-    async for doc in cursor:
-        doc.pop("_id", None)
-        threshold = Thresholds(**doc)
-        await schedule_pre_route_alert(threshold)
-        await schedule_feedback_reminder(threshold)
+    added = 0
+    jobs = []
+    try:
+        cursor = thresholds_collection.find({"date": {"$gte": today}})
+        async for doc in cursor:
+            threshold_id = doc.pop("_id", None)
+            threshold_id = str(threshold_id) if threshold_id is not None else None
+            threshold = Thresholds(**doc)
+            fields = _job_fields(threshold, threshold_id)
+            for kind, fire_at in (
+                (PRE_ROUTE_ALERT, _pre_route_alert_at(threshold)),
+                (FEEDBACK_REMINDER, _feedback_reminder_at(threshold)),
+            ):
+                jobs.append((kind, _job_id(kind, threshold, threshold_id), fire_at, fields))
+            if len(jobs) >= _BACKFILL_BATCH:
+                added += await job_scheduler.schedule_missing(jobs)
+                jobs = []
+        added += await job_scheduler.schedule_missing(jobs)
+    except Exception:
+        logger.exception("Back-filling alert jobs failed after adding %d", added)
+        return
+    logger.info("Back-filled %d alert jobs", added)
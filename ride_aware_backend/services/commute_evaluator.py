@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import logging
-from typing import List, Dict
+from typing import List, Dict, Mapping, Optional, Sequence, Union
 import math
 
+import numpy as np
+
 from models.thresholds import WeatherLimits
 
 
@@ -143,3 +145,158 @@ def evaluate_detailed_thresholds(
         "crosswind": abs(cross) if cross is not None else None,
     }
 
+
+_LIMIT_FIELDS = (
+    "max_wind_speed",
+    "max_rain_intensity",
+    "max_humidity",
+    "min_temperature",
+    "max_temperature",
+    "headwind_sensitivity",
+    "crosswind_sensitivity",
+    "min_visibility",
+    "max_uv_index",
+    "max_pollution",
+)
+
+
+def limits_as_floats(thresholds: WeatherLimits) -> Dict[str, Optional[float]]:
+    limits: Dict[str, Optional[float]] = {}
+    for name in _LIMIT_FIELDS:
+        value = getattr(thresholds, name)
+        limits[name] = float(value) if value is not None else None
+    return limits
+
+
+def _as_array(values, n: int) -> np.ndarray:
+    if values is None:
+        return np.full(n, np.nan)
+    # NumPy maps None to NaN when building a float array.
+    return np.asarray(values, dtype=np.float64)
+
+
+def _column(columns: Mapping, name: str, n: int) -> np.ndarray:
+    return _as_array(columns.get(name), n)
+
+
+def evaluate_detailed_thresholds_batch(
+    columns: Mapping[str, Union[Sequence[Optional[float]], np.ndarray]],
+    thresholds: WeatherLimits,
+    route_bearings: Union[float, Sequence[Optional[float]], np.ndarray, None] = None,
+) -> List[Dict[str, List[str] | float | None]]:
+    """Columnar ``evaluate_detailed_thresholds`` over many points or hours.
+
+    ``columns`` maps weather fields to equal-length arrays, with ``None`` or
+    ``NaN`` for missing values. ``route_bearings`` is a single bearing, one
+    per point, or ``None``. Returns the same per-point dicts as the scalar
+    function, in order.
+    """
+    n = len(next(iter(columns.values()))) if columns else 0
+    limits = limits_as_floats(thresholds)
+
+    wind = np.nan_to_num(_column(columns, "wind_speed", n), nan=0.0)
+    rain = np.nan_to_num(_column(columns, "rain", n), nan=0.0)
+    humidity = np.nan_to_num(_column(columns, "humidity", n), nan=0.0)
+    temp = _column(columns, "temp", n)
+    wind_deg = _column(columns, "wind_deg", n)
+    visibility = _column(columns, "visibility", n)
+    uvi = _column(columns, "uvi", n)
+    pollution = _column(columns, "pollution", n)
+    if route_bearings is None:
+        bearings = np.full(n, np.nan)
+    elif np.isscalar(route_bearings):
+        bearings = np.full(n, float(route_bearings))
+    else:
+        bearings = _as_array(route_bearings, n)
+
+    issue_checks = []
+    borderline_checks = []
+    none = np.zeros(n, dtype=bool)
+
+    def over(values, limit, factor=1.0):
+        return values > limit * factor if limit is not None else none
+
+    max_wind = limits["max_wind_speed"]
+    issue_checks.append(("Wind speed exceeds your comfort limit", over(wind, max_wind)))
+    borderline_checks.append(
+        ("Wind speed near limit", ~over(wind, max_wind) & over(wind, max_wind, 0.8))
+    )
+    max_rain = limits["max_rain_intensity"]
+    issue_checks.append(("Rain intensity exceeds your comfort limit", over(rain, max_rain)))
+    borderline_checks.append(
+        ("Rain near limit", ~over(rain, max_rain) & over(rain, max_rain, 0.8))
+    )
+    issue_checks.append(
+        ("Humidity exceeds your comfort limit", over(humidity, limits["max_humidity"]))
+    )
+
+    min_t, max_t = limits["min_temperature"], limits["max_temperature"]
+    below = temp < min_t if min_t is not None else none
+    above = temp > max_t if max_t is not None else none
+    near_min = ~below & (temp < min_t + 2) if min_t is not None else none
+    near_max = ~above & (temp > max_t - 2) if max_t is not None else none
+    issue_checks.append(("Temperature is below your comfort range", below))
+    issue_checks.append(("Temperature is above your comfort range", above))
+    borderline_checks.append(("Temperature near limit", near_min | near_max))
+
+    min_vis = limits["min_visibility"]
+    issue_checks.append(
+        (
+            "Visibility is below your comfort limit",
+            visibility < min_vis if min_vis is not None else none,
+        )
+    )
+    issue_checks.append(
+        ("UV index exceeds your comfort limit", over(uvi, limits["max_uv_index"]))
+    )
+    issue_checks.append(
+        ("Pollution exceeds your comfort limit", over(pollution, limits["max_pollution"]))
+    )
+
+    has_components = ~np.isnan(wind_deg) & ~np.isnan(bearings)
+    rel = np.radians(((wind_deg - bearings) + 360) % 360)
+    head = np.where(has_components, np.abs(wind * np.cos(rel)), np.nan)
+    cross = np.where(has_components, np.abs(wind * np.sin(rel)), np.nan)
+    for label, component, limit in (
+        ("Headwind", head, limits["headwind_sensitivity"]),
+        ("Crosswind", cross, limits["crosswind_sensitivity"]),
+    ):
+        issue_checks.append((f"{label} exceeds your comfort limit", over(component, limit)))
+        borderline_checks.append(
+            (
+                f"{label} near limit",
+                ~over(component, limit) & over(component, limit, 0.8),
+            )
+        )
+
+    issues = _messages_per_point(issue_checks, n)
+    borderline = _messages_per_point(borderline_checks, n)
+    heads = head.tolist()
+    crosses = cross.tolist()
+    # NaN is the only float that differs from itself.
+    return [
+        {
+            "issues": list(issues[i]),
+            "borderline": list(borderline[i]),
+            "headwind": None if heads[i] != heads[i] else heads[i],
+            "crosswind": None if crosses[i] != crosses[i] else crosses[i],
+        }
+        for i in range(n)
+    ]
+
+
+def _messages_per_point(checks: List[tuple], n: int) -> List[tuple]:
+    """Turn ordered (message, mask) checks into each point's message tuple.
+
+    Every point's flags are packed into one integer so the message tuple is
+    built once per distinct combination rather than once per point.
+    """
+    codes = np.zeros(n, dtype=np.int64)
+    for bit, (_, mask) in enumerate(checks):
+        codes |= mask.astype(np.int64) << bit
+    unique, inverse = np.unique(codes, return_inverse=True)
+    patterns = [
+        tuple(message for bit, (message, _) in enumerate(checks) if code >> bit & 1)
+        for code in unique.tolist()
+    ]
+    return [patterns[k] for k in inverse.tolist()]
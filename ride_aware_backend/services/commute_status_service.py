@@ -5,7 +5,7 @@ from datetime import datetime
 
 from models.thresholds import Thresholds
 from services.commute_evaluator import evaluate_thresholds
-from services.weather_service import get_hourly_forecast
+from services.weather_service import get_forecasts_at
 from services.db import thresholds_collection
 from utils.commute_window import parse_time
 
@@ -30,8 +30,7 @@ async def get_commute_status(device_id: str) -> dict:
     start_dt = datetime.combine(today, parse_time(thresholds.start_time))
     end_dt = datetime.combine(today, parse_time(thresholds.end_time))
 
-    start_weather = get_hourly_forecast(lat, lon, start_dt)
-    end_weather = get_hourly_forecast(lat, lon, end_dt)
+    start_weather, end_weather = await get_forecasts_at(lat, lon, [start_dt, end_dt])
     logger.debug(
         "Start weather: %s, End weather: %s", start_weather, end_weather
     )
@@ -1,6 +1,6 @@
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
-from config import MONGO_URI
+from config import MONGO_URI, WIND_RECORD_RETENTION_DAYS, JOB_RETENTION_DAYS
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +15,9 @@ feedback_collection = db["feedback"]
 ride_history_collection = db["ride_history"]
 forecasts_collection = db["forecasts"]
 weather_history_collection = db["weather_history"]
+wind_directions_collection = db["wind_directions"]
+wind_routes_collection = db["wind_routes"]
+scheduled_jobs_collection = db["scheduled_jobs"]
 
 
 async def _ensure_index(coll, keys, **kwargs):
@@ -27,6 +30,12 @@ async def _ensure_index(coll, keys, **kwargs):
 
 
 async def init_db() -> None:
+    await _ensure_index(
+        fcm_tokens_collection,
+        [("device_id", 1)],
+        unique=True,
+        name="uniq_fcm_device",
+    )
     await _ensure_index(
         thresholds_collection,
         [("device_id", 1), ("date", 1), ("start_time", 1), ("end_time", 1)],
@@ -65,3 +74,62 @@ async def init_db() -> None:
     )
 
     await _ensure_index(routes_collection, [("device_id", 1)], name="idx_route_device")
+
+    # Per-hour documents from the old forecast store have no cell/run and no
+    # expiry; nothing reads them, and their null keys would block the index.
+    try:
+        result = await forecasts_collection.delete_many({"cell": {"$exists": False}})
+        if result.deleted_count:
+            logger.info("Removed %s legacy forecast documents", result.deleted_count)
+    except Exception as e:
+        logger.warning("Legacy forecast cleanup failed: %s", e)
+    await _ensure_index(
+        forecasts_collection,
+        [("cell", 1), ("run", 1)],
+        unique=True,
+        partialFilterExpression={"cell": {"$exists": True}},
+        name="uniq_forecast_cell_run",
+    )
+    await _ensure_index(
+        forecasts_collection,
+        [("expires_at", 1)],
+        expireAfterSeconds=0,
+        name="ttl_forecast_expires_at",
+    )
+
+    wind_retention_s = WIND_RECORD_RETENTION_DAYS * 86400
+    await _ensure_index(
+        wind_directions_collection,
+        [("timestamp", 1)],
+        expireAfterSeconds=wind_retention_s,
+        name="ttl_wind_timestamp",
+    )
+    await _ensure_index(
+        wind_directions_collection,
+        [("route_hash", 1), ("timestamp", -1)],
+        name="idx_wind_route_ts",
+    )
+    await _ensure_index(
+        wind_routes_collection,
+        [("last_seen_at", 1)],
+        expireAfterSeconds=wind_retention_s,
+        name="ttl_wind_route_last_seen",
+    )
+
+    await _ensure_index(
+        scheduled_jobs_collection,
+        [("status", 1), ("fire_at", 1)],
+        name="idx_job_status_fire_at",
+    )
+    await _ensure_index(
+        scheduled_jobs_collection,
+        [("device_id", 1), ("status", 1)],
+        name="idx_job_device_status",
+    )
+    # Only finished jobs carry finished_at, so only they age out.
+    await _ensure_index(
+        scheduled_jobs_collection,
+        [("finished_at", 1)],
+        expireAfterSeconds=JOB_RETENTION_DAYS * 86400,
+        name="ttl_job_finished_at",
+    )
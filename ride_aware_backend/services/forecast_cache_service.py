@@ -1,15 +1,57 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Dict
+import logging
+from datetime import datetime, timezone
+from typing import List, Dict, Optional
 
+from pymongo.errors import PyMongoError
+
+from utils.forecast_grid import GridCell, cell_key
 from .db import forecasts_collection
 
-async def save_hourly_forecasts(lat: float, lon: float, forecasts: List[Dict]) -> None:
-    doc = {
-        "lat": lat,
-        "lon": lon,
-        "created_at": datetime.now(),
-        "forecasts": forecasts,
-    }
-    await forecasts_collection.insert_one(doc)
+logger = logging.getLogger(__name__)
+
+
+async def load_forecast_run(
+    cell: GridCell, run: datetime, slots: int
+) -> Optional[Dict]:
+    """Return the stored ``forecasts`` and ``fetched_at`` for ``cell`` at ``run``."""
+    try:
+        doc = await forecasts_collection.find_one(
+            {"cell": cell_key(cell), "run": run, "slots": {"$gte": slots}},
+            {"_id": 0, "forecasts": 1, "fetched_at": 1},
+        )
+    except PyMongoError as e:
+        logger.warning("Forecast store lookup failed for cell %s: %s", cell, e)
+        return None
+    return doc
+
+
+async def save_forecast_run(
+    cell: GridCell,
+    lat: float,
+    lon: float,
+    run: datetime,
+    slots: int,
+    forecasts: List[Dict],
+    expires_at: datetime,
+    fetched_at: Optional[datetime] = None,
+) -> None:
+    """Upsert the series for one (cell, run); the TTL index drops it at ``expires_at``."""
+    try:
+        await forecasts_collection.update_one(
+            {"cell": cell_key(cell), "run": run},
+            {
+                "$set": {
+                    "lat": lat,
+                    "lon": lon,
+                    "slots": slots,
+                    "forecasts": forecasts,
+                    "fetched_at": fetched_at or datetime.now(timezone.utc),
+                    "expires_at": expires_at,
+                }
+            },
+            upsert=True,
+        )
+    except PyMongoError as e:
+        logger.warning("Forecast store upsert failed for cell %s: %s", cell, e)
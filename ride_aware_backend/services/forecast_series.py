@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+METRICS = (
+    "wind_speed",
+    "wind_deg",
+    "rain",
+    "humidity",
+    "temp",
+    "visibility",
+    "uvi",
+    "clouds",
+)
+SLOT_SECONDS = 3 * 3600
+
+
+def _to_float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _to_python(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+class ForecastSeries:
+    """Forecast slots for one grid cell, held as NumPy columns.
+
+    ``times`` are unix timestamps in ascending order and every metric column
+    is a float array aligned with them, ``NaN`` marking a missing value.
+    A stale copy labels every snapshot it returns with the forecast's age.
+    """
+
+    __slots__ = ("times", "columns", "fetched_at", "stale")
+
+    def __init__(
+        self,
+        times: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        fetched_at: Optional[float] = None,
+        stale: bool = False,
+    ) -> None:
+        self.times = times
+        self.columns = columns
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.stale = stale
+
+    def as_stale(self) -> "ForecastSeries":
+        return ForecastSeries(self.times, self.columns, self.fetched_at, stale=True)
+
+    def age_seconds(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+    def _labels(self) -> Dict:
+        if not self.stale:
+            return {}
+        return {"stale": True, "forecast_age_s": int(self.age_seconds())}
+
+    @classmethod
+    def from_records(
+        cls, records: Iterable[Dict], fetched_at: Optional[float] = None
+    ) -> "ForecastSeries":
+        rows = sorted(records, key=lambda r: r.get("dt", 0))
+        times = np.array([r.get("dt", 0) for r in rows], dtype=np.int64)
+        columns = {
+            m: np.array([_to_float(r.get(m)) for r in rows], dtype=np.float64)
+            for m in METRICS
+        }
+        # OpenWeather omits the rain block for dry slots.
+        if rows and not np.isnan(columns["rain"]).all():
+            columns["rain"] = np.nan_to_num(columns["rain"], nan=0.0)
+        return cls(times, columns, fetched_at)
+
+    def to_records(self) -> List[Dict]:
+        return [
+            {"dt": int(ts), **{m: _to_python(self.columns[m][i]) for m in METRICS}}
+            for i, ts in enumerate(self.times)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def interpolate(self, target_ts: np.ndarray) -> Dict[str, np.ndarray]:
+        """Linearly interpolate every metric at ``target_ts``, clamping at the ends.
+
+        Wind direction is interpolated through its unit vector so that
+        350° and 10° blend to 0° rather than 180°.
+        """
+        target_ts = np.asarray(target_ts, dtype=np.float64)
+        out: Dict[str, np.ndarray] = {}
+        for metric, values in self.columns.items():
+            valid = ~np.isnan(values)
+            if not valid.any():
+                out[metric] = np.full(target_ts.shape, np.nan)
+                continue
+            xs = self.times[valid]
+            if metric == "wind_deg":
+                rad = np.radians(values[valid])
+                s = np.interp(target_ts, xs, np.sin(rad))
+                c = np.interp(target_ts, xs, np.cos(rad))
+                out[metric] = np.degrees(np.arctan2(s, c)) % 360
+            else:
+                out[metric] = np.interp(target_ts, xs, values[valid])
+        return out
+
+    def at_timestamps(self, target_ts: Sequence[float]) -> List[Dict]:
+        cols = self.interpolate(np.asarray(target_ts, dtype=np.float64))
+        count = len(target_ts)
+        labels = self._labels()
+        return [
+            {**{m: _to_python(cols[m][i]) for m in METRICS}, **labels}
+            for i in range(count)
+        ]
+
+    def at(self, target_time: datetime) -> Dict:
+        return self.at_timestamps([target_time.timestamp()])[0]
+
+    def at_many(self, target_times: Sequence[datetime]) -> List[Dict]:
+        return self.at_timestamps([t.timestamp() for t in target_times])
+
+    def upcoming(self, now_ts: float, count: int) -> List[Dict]:
+        """Return up to ``count`` slots starting with the one covering ``now_ts``."""
+        start = int(np.searchsorted(self.times + SLOT_SECONDS, now_ts, side="right"))
+        labels = self._labels()
+        return [
+            {
+                "dt": int(self.times[i]),
+                **{m: _to_python(self.columns[m][i]) for m in METRICS},
+                **labels,
+            }
+            for i in range(start, min(start + count, len(self.times)))
+        ]
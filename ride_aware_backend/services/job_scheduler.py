@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+from config import (
+    JOB_POLL_INTERVAL_S,
+    JOB_MAX_LATENESS_S,
+    JOB_CLAIM_BATCH,
+    JOB_CONCURRENCY,
+    JOB_LEASE_S,
+    WORKER_ID,
+)
+from services.db import scheduled_jobs_collection
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+EXPIRED = "expired"
+CANCELLED = "cancelled"
+
+# Claims issued at once while working through due jobs.
+_CLAIMERS = 8
+
+_DUPLICATE_KEY = 11000
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+# Receives every job of its kind due in the same tick and returns the
+# errors of the jobs that failed, keyed by job id.
+BatchJobHandler = Callable[
+    [List[Dict[str, Any]]], Awaitable[Optional[Dict[str, Exception]]]
+]
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Mongo hands back naive datetimes that are already UTC.
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class JobScheduler:
+    """Durable one-shot jobs stored in Mongo and fired by a single loop.
+
+    Each job is a small document (kind, references, ``fire_at``, status).
+    Nothing is preloaded: each pass of the loop claims due jobs straight
+    from the collection, oldest first, with ``find_one_and_update``, up to
+    ``claim_batch`` at a time. A claim sets ``owner`` and
+    ``lease_expires_at`` atomically, so several processes sharing the
+    collection each take different jobs and more workers drain a large
+    wave faster. Only the owner may finish a job; one whose owner died
+    mid-run becomes claimable again once its lease lapses. A pass that
+    fills its batch is followed straight away by another; otherwise the
+    loop sleeps until the next pending ``fire_at`` (or ``poll_interval_s``,
+    or an earlier job being scheduled). Jobs that would fire more than
+    ``max_lateness_s`` late are marked expired instead.
+
+    Kinds registered with ``batch=True`` get all of their jobs claimed in
+    the same pass in one handler call, so shared work (a forecast per
+    location, one token lookup) is done once per pass rather than per job.
+    """
+
+    def __init__(
+        self,
+        collection,
+        *,
+        poll_interval_s: float,
+        max_lateness_s: float,
+        claim_batch: int,
+        concurrency: int,
+        worker_id: str,
+        lease_s: float,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.collection = collection
+        self.poll_interval_s = poll_interval_s
+        self.max_lateness_s = max_lateness_s
+        self.claim_batch = claim_batch
+        self.concurrency = concurrency
+        self.worker_id = worker_id
+        self.lease_s = lease_s
+        self._clock = clock
+        self._handlers: Dict[str, Tuple[Callable, bool]] = {}
+        self._next_due = math.inf
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._stats = {
+            "scheduled": 0,
+            "claimed": 0,
+            "fired": 0,
+            "failed": 0,
+            "expired": 0,
+            "batches": 0,
+            "lease_lost": 0,
+            "cancelled": 0,
+        }
+
+    def register(self, kind: str, handler: Callable, *, batch: bool = False) -> None:
+        self._handlers[kind] = (handler, batch)
+
+    def _now(self) -> datetime:
+        return datetime.fromtimestamp(self._clock(), timezone.utc)
+
+    def _job_doc(self, kind: str, fire_at: datetime, fields: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "kind": kind,
+            "fire_at": _as_utc(fire_at),
+            "status": PENDING,
+            "scheduled_at": self._now(),
+            "attempts": 0,
+            **fields,
+        }
+
+    async def schedule(
+        self, kind: str, job_id: str, fire_at: datetime, **fields: Any
+    ) -> None:
+        """Create or move a job. Re-scheduling an unchanged job is a no-op,
+        so a job that already ran is not run again."""
+        doc = self._job_doc(kind, fire_at, fields)
+        fire_at = doc["fire_at"]
+        moved = await self.collection.update_one(
+            {"_id": job_id, "fire_at": {"$ne": fire_at}}, {"$set": doc}
+        )
+        if not moved.matched_count:
+            try:
+                await self.collection.update_one(
+                    {"_id": job_id}, {"$setOnInsert": doc}, upsert=True
+                )
+            except DuplicateKeyError:
+                # Another worker inserted the same job first.
+                pass
+        self._stats["scheduled"] += 1
+        if fire_at.timestamp() < self._next_due and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def schedule_missing(
+        self, jobs: List[Tuple[str, str, datetime, Dict[str, Any]]]
+    ) -> int:
+        """Insert the ``(kind, job_id, fire_at, fields)`` jobs that do not
+        exist yet in one bulk write; existing jobs are left untouched.
+        Returns how many were added."""
+        if not jobs:
+            return 0
+        ops = [
+            UpdateOne(
+                {"_id": job_id},
+                {"$setOnInsert": self._job_doc(kind, fire_at, fields)},
+                upsert=True,
+            )
+            for kind, job_id, fire_at, fields in jobs
+        ]
+        try:
+            added = (await self.collection.bulk_write(ops, ordered=False)).upserted_count
+        except BulkWriteError as e:
+            # Jobs another worker inserted at the same moment are fine.
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != _DUPLICATE_KEY for err in errors):
+                raise
+            added = e.details.get("nUpserted", 0)
+        self._stats["scheduled"] += added
+        if added and self._wakeup is not None:
+            self._wakeup.set()
+        return added
+
+    async def cancel(self, query: Dict[str, Any]) -> int:
+        """Cancel the pending jobs matching ``query``; returns how many."""
+        result = await self.collection.update_many(
+            {**query, "status": PENDING},
+            {"$set": {"status": CANCELLED, "finished_at": self._now()}},
+        )
+        if result.modified_count:
+            self._stats["cancelled"] += result.modified_count
+        return result.modified_count
+
+    async def pending_counts(self, device_id: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Pending jobs per device and kind, for one device or all."""
+        match: Dict[str, Any] = {"status": PENDING}
+        if device_id is not None:
+            match["device_id"] = device_id
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {"device_id": "$device_id", "kind": "$kind"},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+        counts: Dict[str, Dict[str, int]] = {}
+        async for row in self.collection.aggregate(pipeline):
+            key = row["_id"]
+            counts.setdefault(key.get("device_id"), {})[key["kind"]] = row["count"]
+        return counts
+
+    async def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._task, *self._inflight) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                jobs, full = await self._claim_due()
+            except PyMongoError as e:
+                logger.warning("Could not claim scheduled jobs: %s", e)
+                jobs, full = [], False
+            self._dispatch(jobs)
+            if full:
+                # More jobs are due; take them once there is room to run them.
+                while len(self._inflight) >= self.concurrency:
+                    await asyncio.wait(
+                        self._inflight, return_when=asyncio.FIRST_COMPLETED
+                    )
+                continue
+            # Not wait_for: on 3.11 it swallows stop()'s cancel when the
+            # event is set at the same moment.
+            woken = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait([woken], timeout=await self._until_next_due())
+            finally:
+                woken.cancel()
+
+    async def _until_next_due(self) -> float:
+        self._next_due = math.inf
+        try:
+            cursor = (
+                self.collection.find({"status": PENDING}, {"fire_at": 1})
+                .sort("fire_at", 1)
+                .limit(1)
+            )
+            async for doc in cursor:
+                self._next_due = _as_utc(doc["fire_at"]).timestamp()
+        except PyMongoError as e:
+            logger.warning("Could not read the next job time: %s", e)
+        return max(0.0, min(self.poll_interval_s, self._next_due - self._clock()))
+
+    def _abandoned(self, now: datetime) -> Dict[str, Any]:
+        # Running jobs whose owner has not finished them within the lease.
+        return {"status": RUNNING, "lease_expires_at": {"$lte": now}}
+
+    async def _claim_due(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """Claim up to ``claim_batch`` due jobs; also says if more may be due."""
+        claimed: List[Dict[str, Any]] = []
+        taken = 0
+        drained = False
+
+        async def claimer() -> None:
+            nonlocal taken, drained
+            while taken < self.claim_batch and not drained:
+                taken += 1
+                found, job = await self._claim_next()
+                if not found:
+                    drained = True
+                elif job is not None:
+                    claimed.append(job)
+
+        await asyncio.gather(*(claimer() for _ in range(_CLAIMERS)))
+        return claimed, not drained
+
+    async def _claim_next(self) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Claim the oldest due job: ``(False, None)`` if none is due, and
+        ``(True, None)`` if the one claimed was too late and has expired."""
+        now = self._now()
+        job = await self.collection.find_one_and_update(
+            {
+                "fire_at": {"$lte": now},
+                "$or": [{"status": PENDING}, self._abandoned(now)],
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "started_at": now,
+                    "owner": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_s),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("fire_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            return False, None
+        self._stats["claimed"] += 1
+        # A job scheduled after its fire time runs at once; lateness
+        # only counts from when it could first have run.
+        due = max(_as_utc(job["fire_at"]), _as_utc(job["scheduled_at"]))
+        if (now - due).total_seconds() > self.max_lateness_s:
+            logger.info("Job %s expired %s late", job["_id"], now - due)
+            self._stats["expired"] += 1
+            await self._finish(job["_id"], EXPIRED)
+            return True, None
+        return True, job
+
+    def _dispatch(self, jobs: List[Dict[str, Any]]) -> None:
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        for job in jobs:
+            if self._handlers.get(job["kind"], (None, False))[1]:
+                batches.setdefault(job["kind"], []).append(job)
+            else:
+                self._start(job["kind"], [job])
+        for kind, batch in batches.items():
+            self._start(kind, batch)
+
+    def _start(self, kind: str, jobs: List[Dict[str, Any]]) -> None:
+        task = asyncio.create_task(self._fire(kind, jobs))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _fire(self, kind: str, jobs: List[Dict[str, Any]]) -> None:
+        async with self._sem:
+            handler, batch = self._handlers.get(kind, (None, False))
+            failures: Dict[str, Exception] = {}
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler for job kind {kind!r}")
+                if batch:
+                    self._stats["batches"] += 1
+                    failures = await handler(jobs) or {}
+                else:
+                    await handler(jobs[0])
+            except Exception as e:
+                logger.exception("Job(s) %s failed", [job["_id"] for job in jobs])
+                failures = {job["_id"]: e for job in jobs}
+            for job in jobs:
+                error = failures.get(job["_id"])
+                if error is None:
+                    self._stats["fired"] += 1
+                    await self._finish(job["_id"], DONE)
+                else:
+                    if batch:
+                        logger.warning("Job %s failed: %s", job["_id"], error)
+                    self._stats["failed"] += 1
+                    await self._finish(job["_id"], FAILED, error=str(error))
+
+    async def _finish(self, job_id: str, status: str, **fields: Any) -> None:
+        result = await self.collection.update_one(
+            {"_id": job_id, "status": RUNNING, "owner": self.worker_id},
+            {"$set": {"status": status, "finished_at": self._now(), **fields}},
+        )
+        if not result.matched_count:
+            # The lease ran out and another worker has taken the job over.
+            logger.warning("Lost lease on job %s before finishing it", job_id)
+            self._stats["lease_lost"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "running": len(self._inflight)}
+
+
+job_scheduler = JobScheduler(
+    scheduled_jobs_collection,
+    poll_interval_s=JOB_POLL_INTERVAL_S,
+    max_lateness_s=JOB_MAX_LATENESS_S,
+    claim_batch=JOB_CLAIM_BATCH,
+    concurrency=JOB_CONCURRENCY,
+    worker_id=WORKER_ID,
+    lease_s=JOB_LEASE_S,
+)
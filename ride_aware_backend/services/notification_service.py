@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    NOTIFICATION_SENDER,
+    NOTIFICATION_BATCH_SIZE,
+    FCM_TOKEN_CACHE_SIZE,
+    FCM_TOKEN_CACHE_TTL_S,
+)
+from services.db import fcm_tokens_collection
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# device_id -> FCM token. Only tokens found are cached, so a device that
+# registers is reachable at once. /fcm/register/ drops the entry in its
+# own worker; others re-read a batch's tokens when a send fails and
+# otherwise pick a new token up once their entry expires.
+_token_cache = TTLCache(maxsize=FCM_TOKEN_CACHE_SIZE, ttl=FCM_TOKEN_CACHE_TTL_S)
+_token_stats = {"lookups": 0, "missing": 0}
+_send_stats = {"sent": 0, "failed": 0}
+
+
+@dataclass
+class Notification:
+
+    device_id: str
+    token: str
+    message: str
+
+
+class NotificationSender(ABC):
+    """Delivers notifications that already carry their device token.
+
+    ``send_batch`` raises if the batch could not be delivered.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def send_batch(self, notifications: List[Notification]) -> None:
+        ...
+
+
+class LogSender(NotificationSender):
+    """Logs each notification instead of delivering it."""
+
+    name = "log"
+
+    async def send_batch(self, notifications: List[Notification]) -> None:
+        for n in notifications:
+            logger.info("Would send notification to %s: %s", n.device_id, n.message)
+
+
+class MemorySender(NotificationSender):
+    """Keeps every batch in memory, for tests and local runs."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self.batches: List[List[Notification]] = []
+
+    @property
+    def sent(self) -> List[Notification]:
+        return [n for batch in self.batches for n in batch]
+
+    async def send_batch(self, notifications: List[Notification]) -> None:
+        self.batches.append(list(notifications))
+
+
+def build_sender(name: str = NOTIFICATION_SENDER) -> NotificationSender:
+    if name == "log":
+        return LogSender()
+    if name == "memory":
+        return MemorySender()
+    raise ValueError(f"Unknown NOTIFICATION_SENDER {name!r}")
+
+
+_sender: Optional[NotificationSender] = None
+
+
+def get_notification_sender() -> NotificationSender:
+    global _sender
+    if _sender is None:
+        _sender = build_sender()
+        logger.info("Using %s notification sender", _sender.name)
+    return _sender
+
+
+def set_notification_sender(sender: Optional[NotificationSender]) -> None:
+    """Swap the process-wide sender; ``None`` rebuilds it from config."""
+    global _sender
+    _sender = sender
+
+
+def invalidate_token(device_id: str) -> None:
+    _token_cache.pop(device_id)
+
+
+async def lookup_tokens(device_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Tokens for ``device_ids``, fetching every cache miss in one query."""
+    tokens: Dict[str, Optional[str]] = {}
+    missing = []
+    for device_id in set(device_ids):
+        cached = _token_cache.get(device_id)
+        if cached is None:
+            missing.append(device_id)
+        else:
+            tokens[device_id] = cached
+    if missing:
+        _token_stats["lookups"] += 1
+        found = {}
+        cursor = fcm_tokens_collection.find(
+            {"device_id": {"$in": missing}}, {"device_id": 1, "fcm_token": 1}
+        )
+        async for doc in cursor:
+            found[doc["device_id"]] = doc.get("fcm_token")
+        for device_id in missing:
+            token = found.get(device_id) or None
+            if token:
+                _token_cache.set(device_id, token)
+            tokens[device_id] = token
+    return tokens
+
+
+async def _with_tokens(
+    messages: Dict[str, Tuple[str, str]]
+) -> List[Tuple[str, Notification]]:
+    tokens = await lookup_tokens(device_id for device_id, _ in messages.values())
+    ready: List[Tuple[str, Notification]] = []
+    for key, (device_id, message) in messages.items():
+        token = tokens.get(device_id)
+        if token:
+            ready.append((key, Notification(device_id, token, message)))
+        else:
+            _token_stats["missing"] += 1
+            logger.warning("No FCM token for %s; skipping notification", device_id)
+    return ready
+
+
+async def send_notifications(
+    messages: Dict[str, Tuple[str, str]]
+) -> Dict[str, Exception]:
+    """Send ``key -> (device_id, message)`` now, in batches of
+    ``NOTIFICATION_BATCH_SIZE``, and return the errors of the batches that
+    failed, keyed like ``messages``.
+
+    Devices without a token are skipped with a warning; nothing can reach
+    them, so retrying would not help. A batch that fails is sent once more
+    with its tokens re-read, in case a device registered a new one with
+    another worker. A failed token lookup raises.
+    """
+    ready = await _with_tokens(messages)
+    sender = get_notification_sender()
+    failures: Dict[str, Exception] = {}
+    for i in range(0, len(ready), NOTIFICATION_BATCH_SIZE):
+        batch = ready[i : i + NOTIFICATION_BATCH_SIZE]
+        try:
+            try:
+                await sender.send_batch([n for _, n in batch])
+            except Exception as e:
+                logger.info("Retrying %d notifications with fresh tokens: %s", len(batch), e)
+                for _, n in batch:
+                    invalidate_token(n.device_id)
+                batch = await _with_tokens(
+                    {key: (n.device_id, n.message) for key, n in batch}
+                )
+                await sender.send_batch([n for _, n in batch])
+        except Exception as e:
+            logger.warning("Could not send %d notifications: %s", len(batch), e)
+            _send_stats["failed"] += len(batch)
+            failures.update((key, e) for key, _ in batch)
+        else:
+            _send_stats["sent"] += len(batch)
+    return failures
+
+
+def notification_stats() -> Dict[str, Dict]:
+    return {
+        "sends": dict(_send_stats),
+        "token_cache": _token_cache.stats(),
+        "tokens": dict(_token_stats),
+    }
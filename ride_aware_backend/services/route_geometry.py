@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import ROUTE_SIMPLIFY_TOLERANCE_M
+
+EARTH_RADIUS_M = 6371000.0
+SAMPLE_SPACING_M = 1000.0
+# Bump when the stored summary layout changes so old documents are rebuilt.
+SUMMARY_VERSION = 2
+
+
+class RouteGeometry:
+    """Per-segment and per-point geometry of a polyline, as NumPy arrays.
+
+    Segment ``i`` runs from point ``i`` to point ``i + 1``. A point's local
+    bearing is the circular mean of the segments either side of it; points
+    with no segment of non-zero length next to them get ``NaN``.
+    """
+
+    __slots__ = (
+        "lat",
+        "lon",
+        "segment_lengths_m",
+        "segment_bearings",
+        "cumulative_m",
+        "point_bearings",
+    )
+
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        segment_lengths_m: np.ndarray,
+        segment_bearings: np.ndarray,
+        cumulative_m: np.ndarray,
+        point_bearings: np.ndarray,
+    ) -> None:
+        self.lat = lat
+        self.lon = lon
+        self.segment_lengths_m = segment_lengths_m
+        self.segment_bearings = segment_bearings
+        self.cumulative_m = cumulative_m
+        self.point_bearings = point_bearings
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @property
+    def total_m(self) -> float:
+        return float(self.cumulative_m[-1]) if len(self.cumulative_m) else 0.0
+
+
+def points_hash(points: Sequence[Dict[str, float]]) -> str:
+    """Stable digest of a route's coordinates, rounded to about 0.1 m."""
+    return coords_hash(
+        [float(pt["latitude"]) for pt in points], [float(pt["longitude"]) for pt in points]
+    )
+
+
+def coords_hash(lats: Sequence[float], lons: Sequence[float]) -> str:
+    digest = hashlib.sha1()
+    for lat, lon in zip(lats, lons):
+        digest.update(f"{lat:.6f},{lon:.6f};".encode())
+    return digest.hexdigest()
+
+
+def segment_lengths(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Haversine length in metres of each segment between consecutive points."""
+    phi = np.radians(lat)
+    dphi = np.diff(phi)
+    dlam = np.diff(np.radians(lon))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi[:-1]) * np.cos(phi[1:]) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def compute_route_geometry(points: Sequence[Dict[str, float]]) -> RouteGeometry:
+    lat = np.array([float(pt["latitude"]) for pt in points], dtype=np.float64)
+    lon = np.array([float(pt["longitude"]) for pt in points], dtype=np.float64)
+    phi = np.radians(lat)
+    phi1, phi2 = phi[:-1], phi[1:]
+    dlam = np.diff(np.radians(lon))
+    lengths = segment_lengths(lat, lon)
+
+    y = np.sin(dlam) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlam)
+    seg_rad = np.arctan2(y, x)
+    moving = lengths > 0
+    segment_bearings = np.where(moving, np.degrees(seg_rad) % 360, np.nan)
+
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+
+    # Sum the unit vectors of the segments before and after each point.
+    sin_seg = np.where(moving, np.sin(seg_rad), 0.0)
+    cos_seg = np.where(moving, np.cos(seg_rad), 0.0)
+    sin_sum = np.zeros(len(lat))
+    cos_sum = np.zeros(len(lat))
+    sin_sum[:-1] += sin_seg
+    sin_sum[1:] += sin_seg
+    cos_sum[:-1] += cos_seg
+    cos_sum[1:] += cos_seg
+    defined = (sin_sum != 0) | (cos_sum != 0)
+    point_bearings = np.where(
+        defined, np.degrees(np.arctan2(sin_sum, cos_sum)) % 360, np.nan
+    )
+
+    return RouteGeometry(
+        lat, lon, lengths, segment_bearings, cumulative, point_bearings
+    )
+
+
+def simplify_indices(lat: np.ndarray, lon: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Douglas–Peucker over a polyline, returning the indices of kept points.
+
+    Points are projected onto a local equirectangular plane, which is accurate
+    to well under a metre over commute distances. All spans at one recursion
+    depth are split together, so each level is a handful of array operations
+    however many points it covers.
+    """
+    n = len(lat)
+    if n <= 2 or tolerance_m <= 0:
+        return np.arange(n)
+    lat0 = np.radians(lat.mean())
+    y = np.radians(lat) * EARTH_RADIUS_M
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(lat0)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    firsts = np.array([0])
+    lasts = np.array([n - 1])
+    while len(firsts):
+        counts = lasts - firsts - 1
+        offsets = np.cumsum(counts) - counts
+        span = np.repeat(np.arange(len(firsts)), counts)
+        idx = np.arange(counts.sum()) - offsets[span] + firsts[span] + 1
+        first, last = firsts[span], lasts[span]
+
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[idx] - x[first]
+        py = y[idx] - y[first]
+        chord = np.hypot(dx, dy)
+        # A closed loop has no chord; use the distance from its endpoint.
+        dist = np.where(
+            chord > 0,
+            np.abs(px * dy - py * dx) / np.where(chord > 0, chord, 1.0),
+            np.hypot(px, py),
+        )
+
+        worst = np.maximum.reduceat(dist, offsets)
+        split_spans = np.flatnonzero(worst > tolerance_m)
+        if not len(split_spans):
+            break
+        # First point in each span that reaches the span's maximum.
+        at_max = np.flatnonzero(dist == worst[span])
+        spans_at_max, first_pos = np.unique(span[at_max], return_index=True)
+        split_at = np.empty(len(firsts), dtype=np.int64)
+        split_at[spans_at_max] = idx[at_max[first_pos]]
+        splits = split_at[split_spans]
+        keep[splits] = True
+
+        firsts = np.concatenate((firsts[split_spans], splits))
+        lasts = np.concatenate((splits, lasts[split_spans]))
+        wide = lasts - firsts >= 2
+        firsts, lasts = firsts[wide], lasts[wide]
+    return np.flatnonzero(keep)
+
+
+def simplify_points(
+    points: Sequence[Dict[str, Any]], tolerance_m: float
+) -> List[Dict[str, Any]]:
+    """Return the subset of ``points`` Douglas–Peucker keeps at ``tolerance_m``."""
+    lat = np.array([float(pt["latitude"]) for pt in points], dtype=np.float64)
+    lon = np.array([float(pt["longitude"]) for pt in points], dtype=np.float64)
+    return [points[i] for i in simplify_indices(lat, lon, tolerance_m).tolist()]
+
+
+def sample_polyline(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    spacing_m: float = SAMPLE_SPACING_M,
+    lengths: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Points every ``spacing_m`` along a polyline, excluding the start.
+
+    Returns ``(lat, lon, distance_m)`` arrays, interpolating linearly in
+    lat/lon within the segment each target distance falls in. ``lengths``
+    may pass in segment lengths that are already known.
+    """
+    if len(lat) < 2:
+        empty = np.empty(0)
+        return empty, empty, empty
+    if lengths is None:
+        lengths = segment_lengths(lat, lon)
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+    targets = np.arange(1, int(cumulative[-1] // spacing_m) + 1) * float(spacing_m)
+    # First segment whose end reaches the target distance.
+    seg = np.searchsorted(cumulative[1:], targets, side="left")
+    seg = np.minimum(seg, len(lengths) - 1)
+    seg_len = lengths[seg]
+    ratio = np.divide(
+        targets - cumulative[seg], seg_len, out=np.zeros_like(targets), where=seg_len > 0
+    )
+    sample_lat = lat[seg] + ratio * (lat[seg + 1] - lat[seg])
+    sample_lon = lon[seg] + ratio * (lon[seg + 1] - lon[seg])
+    return sample_lat, sample_lon, targets
+
+
+def sample_along(
+    geometry: RouteGeometry, spacing_m: float = SAMPLE_SPACING_M
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """``sample_polyline`` over a route whose geometry is already computed."""
+    return sample_polyline(
+        geometry.lat, geometry.lon, spacing_m, geometry.segment_lengths_m
+    )
+
+
+def build_route_summary(
+    points: Sequence[Dict[str, Any]],
+    spacing_m: float = SAMPLE_SPACING_M,
+    simplify_tolerance_m: float = ROUTE_SIMPLIFY_TOLERANCE_M,
+) -> Dict[str, Any]:
+    """Derive the geometry stored alongside a saved route."""
+    geometry = compute_route_geometry(points)
+    kept = simplify_indices(geometry.lat, geometry.lon, simplify_tolerance_m)
+    lat, lon, dist = sample_along(geometry, spacing_m)
+    return {
+        "version": SUMMARY_VERSION,
+        "points_hash": points_hash(points),
+        "total_m": geometry.total_m,
+        "sample_spacing_m": spacing_m,
+        "samples": [
+            {"latitude": la, "longitude": lo, "distance_m": d}
+            for la, lo, d in zip(lat.tolist(), lon.tolist(), dist.tolist())
+        ],
+        # Reduced polyline for wind sampling; route_points stays the display copy.
+        "simplify_tolerance_m": simplify_tolerance_m,
+        "simplified_points": [
+            {"latitude": la, "longitude": lo}
+            for la, lo in zip(
+                geometry.lat[kept].tolist(), geometry.lon[kept].tolist()
+            )
+        ],
+        "computed_at": datetime.now(timezone.utc),
+    }
+
+
+def is_current_summary(summary: Optional[Dict[str, Any]], points_digest: str) -> bool:
+    return (
+        bool(summary)
+        and summary.get("version") == SUMMARY_VERSION
+        and summary.get("points_hash") == points_digest
+        and summary.get("simplify_tolerance_m") == ROUTE_SIMPLIFY_TOLERANCE_M
+    )
+
+
+def route_summary(route_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a route document's stored geometry, building it for older routes."""
+    points = route_doc.get("route_points") or []
+    summary = route_doc.get("geometry")
+    if summary and summary.get("version") == SUMMARY_VERSION:
+        return summary
+    return build_route_summary(points)
+
+
+def bearings_as_list(values: np.ndarray) -> List:
+    """Convert a bearing array to floats with ``None`` in place of ``NaN``."""
+    return [None if v != v else v for v in values.tolist()]
@@ -1,61 +1,244 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from datetime import datetime
-from typing import List, Dict, Any
+import math
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, AsyncIterator, Optional, Sequence, Tuple
 
+import httpx
+
+from config import ROUTE_FETCH_CONCURRENCY, ROUTE_DEADLINE_S, FORECAST_GRID_DEG
 from models.thresholds import WeatherLimits
-from services.weather_service import get_hourly_forecast
-from services.commute_evaluator import evaluate_detailed_thresholds
+from services.weather_service import (
+    get_hourly_forecast,
+    get_forecast_series,
+    ForecastUnavailableError,
+)
+from services.upstream_scheduler import Priority, UpstreamShedError
+from services.commute_evaluator import evaluate_detailed_thresholds_batch
+from services.route_geometry import (
+    RouteGeometry,
+    bearings_as_list,
+    compute_route_geometry,
+)
+from utils.forecast_grid import GridCell, grid_cell
 
 logger = logging.getLogger(__name__)
 
+_EVALUATED_FIELDS = (
+    "wind_speed",
+    "wind_deg",
+    "rain",
+    "humidity",
+    "temp",
+    "visibility",
+    "uvi",
+    "pollution",
+)
+# Errors that cost one point its weather rather than failing the whole route.
+_DEGRADABLE_ERRORS = (UpstreamShedError, ForecastUnavailableError, httpx.HTTPError)
 
-def _bearing(a: Dict[str, float], b: Dict[str, float]) -> float:
-    import math
 
-    lat1 = math.radians(a["latitude"])
-    lat2 = math.radians(b["latitude"])
-    dlon = math.radians(b["longitude"] - a["longitude"])
-    y = math.sin(dlon) * math.cos(lat2)
-    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
-    brng = math.degrees(math.atan2(y, x))
-    return (brng + 360) % 360
+CellResult = Tuple[List[int], Optional[List[Dict[str, Any]]]]
 
 
-def evaluate_route_weather(
-    points: List[Dict[str, float]], time: datetime, thresholds: WeatherLimits
-) -> Dict[str, Any]:
-    if not points:
-        raise ValueError("At least one route point is required")
-
-    route_bearing = _bearing(points[0], points[-1]) if len(points) > 1 else None
-    results: List[Dict[str, Any]] = []
-    overall_issues: set[str] = set()
-    overall_borderline: set[str] = set()
-
-    max_values: Dict[str, float] = {
-        "wind_speed": 0.0,
-        "rain": 0.0,
-        "humidity": 0.0,
-        "headwind": 0.0,
-        "crosswind": 0.0,
-        "temp_max": float("-inf"),
-        "temp_min": float("inf"),
-    }
+async def _iter_cell_weather(
+    points: List[Dict[str, float]],
+    time: datetime,
+    concurrency: int,
+    deadline_s: float,
+    pass_ts: Optional[Sequence[float]] = None,
+) -> AsyncIterator[CellResult]:
+    """Fetch weather once per forecast grid cell, yielding cells as they finish.
 
+    Each item is the cell's point indices and their weather. Cells are
+    fetched concurrently, at most ``concurrency`` at once. Cells that fail
+    with a degradable upstream error, or are still pending when
+    ``deadline_s`` expires, are yielded last with ``None`` weather. If no
+    cell succeeds the first such error is raised instead. With ``pass_ts``
+    each point is resolved at its own timestamp against its cell's series.
+    """
+    cell_members: Dict[GridCell, List[int]] = {}
     for idx, pt in enumerate(points):
-        logger.debug("Fetching weather for point %s: %s", idx, pt)
-        weather = get_hourly_forecast(pt["latitude"], pt["longitude"], time)
-        detailed = evaluate_detailed_thresholds(weather, thresholds, route_bearing)
+        cell = grid_cell(pt["latitude"], pt["longitude"], FORECAST_GRID_DEG)
+        cell_members.setdefault(cell, []).append(idx)
+    logger.debug("Route of %s points spans %s grid cells", len(points), len(cell_members))
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch(members: List[int]) -> List[Dict[str, Any]]:
+        # First point seen in each cell stands in for the whole cell.
+        pt = points[members[0]]
+        async with sem:
+            if pass_ts is None:
+                weather = await get_hourly_forecast(
+                    pt["latitude"], pt["longitude"], time, priority=Priority.SAMPLING
+                )
+                return [weather] * len(members)
+            series = await get_forecast_series(
+                pt["latitude"], pt["longitude"], Priority.SAMPLING
+            )
+        if not len(series):
+            raise ValueError("No forecast data available")
+        return series.at_timestamps([pass_ts[i] for i in members])
+
+    tasks = {
+        asyncio.ensure_future(fetch(members)): cell
+        for cell, members in cell_members.items()
+    }
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_s
+    pending = set(tasks)
+    failed: List[GridCell] = []
+    first_error: Optional[BaseException] = None
+    any_known = False
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                cell = tasks[task]
+                error = task.exception()
+                if error is None:
+                    any_known = True
+                    yield cell_members[cell], task.result()
+                elif isinstance(error, _DEGRADABLE_ERRORS):
+                    logger.info("Weather for route cell %s unavailable: %s", cell, error)
+                    first_error = first_error or error
+                    failed.append(cell)
+                else:
+                    raise error
+    finally:
+        for task in pending:
+            task.cancel()
+    if pending:
+        logger.warning(
+            "Route deadline of %ss hit with %s of %s cells pending",
+            deadline_s,
+            len(pending),
+            len(tasks),
+        )
+    if not any_known:
+        # Nothing to evaluate: report the route as unavailable (a 503 at the
+        # API) rather than as an empty "ok".
+        if isinstance(first_error, (UpstreamShedError, ForecastUnavailableError)):
+            raise first_error
+        raise ForecastUnavailableError(
+            "No forecast arrived for any route point"
+        ) from first_error
+    for cell in failed + [tasks[task] for task in pending]:
+        yield cell_members[cell], None
+
+
+class _RouteContext:
+    """Per-request inputs shared by every point evaluation of one route."""
+
+    def __init__(
+        self,
+        points: List[Dict[str, float]],
+        time: datetime,
+        thresholds: WeatherLimits,
+        speed_kmh: Optional[float],
+    ) -> None:
+        if not points:
+            raise ValueError("At least one route point is required")
+        if speed_kmh is not None and speed_kmh <= 0:
+            raise ValueError("speed_kmh must be positive")
+        self.points = points
+        self.time = time
+        self.thresholds = thresholds
+        self.speed_kmh = speed_kmh
+        # Head/crosswind use the direction of travel at each point.
+        self.geometry: RouteGeometry = compute_route_geometry(points)
+        self.bearings = bearings_as_list(self.geometry.point_bearings)
+        self.distances = self.geometry.cumulative_m.tolist()
+        self.offsets: Optional[List[float]] = None
+        self.pass_ts: Optional[List[float]] = None
+        if speed_kmh is not None:
+            self.offsets = (self.geometry.cumulative_m / (speed_kmh / 3.6)).tolist()
+            start_ts = time.timestamp()
+            self.pass_ts = [start_ts + offset for offset in self.offsets]
+
+    def _record(self, idx: int, weather: Optional[Dict[str, Any]], detailed: Dict) -> Dict:
+        record = {
+            "index": idx,
+            "location": self.points[idx],
+            "bearing": self.bearings[idx],
+            "distance_m": self.distances[idx],
+        }
+        if self.offsets is not None:
+            record["pass_time"] = (
+                self.time + timedelta(seconds=self.offsets[idx])
+            ).isoformat()
+        record.update(
+            weather=weather,
+            issues=detailed["issues"],
+            borderline=detailed["borderline"],
+            headwind=detailed["headwind"],
+            crosswind=detailed["crosswind"],
+        )
+        return record
+
+    def evaluate(
+        self, indices: List[int], weathers: Optional[List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Build point records, evaluating all known points in one batch."""
+        if weathers is None:
+            empty = {"issues": [], "borderline": [], "headwind": None, "crosswind": None}
+            return [self._record(idx, None, empty) for idx in indices]
+        evaluations = evaluate_detailed_thresholds_batch(
+            {f: [w.get(f) for w in weathers] for f in _EVALUATED_FIELDS},
+            self.thresholds,
+            self.geometry.point_bearings[indices],
+        )
+        return [
+            self._record(idx, weather, detailed)
+            for idx, weather, detailed in zip(indices, weathers, evaluations)
+        ]
+
+
+def _finite(value: float) -> Optional[float]:
+    # The running min/max start at +/-inf; JSON has no infinity.
+    return value if math.isfinite(value) else None
+
+
+class _RouteSummary:
+    """Running route status and extremes, fed one point record at a time."""
+
+    def __init__(self, ctx: _RouteContext) -> None:
+        self.ctx = ctx
+        self.unknown: List[int] = []
+        self.issues: set[str] = set()
+        self.borderline: set[str] = set()
+        self.max_values: Dict[str, float] = {
+            "wind_speed": 0.0,
+            "rain": 0.0,
+            "humidity": 0.0,
+            "headwind": 0.0,
+            "crosswind": 0.0,
+            "temp_max": float("-inf"),
+            "temp_min": float("inf"),
+        }
+
+    def add(self, record: Dict[str, Any]) -> None:
+        weather = record["weather"]
+        if weather is None:
+            self.unknown.append(record["index"])
+            return
+        max_values = self.max_values
 
         # Track maxima/minima for summary
         wind = weather.get("wind_speed") or 0
         rain = weather.get("rain") or 0
         humidity = weather.get("humidity") or 0
         temp = weather.get("temp")
-        head = detailed.get("headwind") or 0
-        cross = detailed.get("crosswind") or 0
+        head = record.get("headwind") or 0
+        cross = record.get("crosswind") or 0
 
         max_values["wind_speed"] = max(max_values["wind_speed"], wind)
         max_values["rain"] = max(max_values["rain"], rain)
@@ -66,36 +249,102 @@ def evaluate_route_weather(
             max_values["temp_max"] = max(max_values["temp_max"], temp)
             max_values["temp_min"] = min(max_values["temp_min"], temp)
 
-        overall_issues.update(detailed["issues"])
-        overall_borderline.update(detailed["borderline"])
-
-        results.append(
-            {
-                "index": idx,
-                "location": pt,
-                "weather": weather,
-                "issues": detailed["issues"],
-                "borderline": detailed["borderline"],
-                "headwind": detailed["headwind"],
-                "crosswind": detailed["crosswind"],
-            }
-        )
+        self.issues.update(record["issues"])
+        self.borderline.update(record["borderline"])
 
-    status = "alert" if overall_issues else ("warning" if overall_borderline else "ok")
-    summary = {
-        "max_wind_speed": max_values["wind_speed"],
-        "max_rain": max_values["rain"],
-        "max_humidity": max_values["humidity"],
-        "max_headwind": max_values["headwind"],
-        "max_crosswind": max_values["crosswind"],
-        "min_temp": max_values["temp_min"],
-        "max_temp": max_values["temp_max"],
-    }
+    def result(self) -> Dict[str, Any]:
+        ctx = self.ctx
+        max_values = self.max_values
+        status = "alert" if self.issues else ("warning" if self.borderline else "ok")
+        if status == "ok" and self.unknown:
+            # Nothing breached where weather is known, but not all of it is.
+            status = "partial"
+        summary = {
+            "max_wind_speed": max_values["wind_speed"],
+            "max_rain": max_values["rain"],
+            "max_humidity": max_values["humidity"],
+            "max_headwind": max_values["headwind"],
+            "max_crosswind": max_values["crosswind"],
+            "min_temp": _finite(max_values["temp_min"]),
+            "max_temp": _finite(max_values["temp_max"]),
+            "distance_m": ctx.geometry.total_m,
+        }
+        if ctx.offsets is not None:
+            summary["speed_kmh"] = ctx.speed_kmh
+            summary["duration_s"] = ctx.offsets[-1]
+            summary["arrival_time"] = (
+                ctx.time + timedelta(seconds=ctx.offsets[-1])
+            ).isoformat()
+        return {
+            "status": status,
+            "issues": list(self.issues),
+            "borderline": list(self.borderline),
+            "summary": summary,
+            "unknown_points": sorted(self.unknown),
+        }
 
-    return {
-        "status": status,
-        "issues": list(overall_issues),
-        "borderline": list(overall_borderline),
-        "summary": summary,
-        "points": results,
-    }
+
+async def evaluate_route_weather(
+    points: List[Dict[str, float]],
+    time: datetime,
+    thresholds: WeatherLimits,
+    *,
+    concurrency: int = ROUTE_FETCH_CONCURRENCY,
+    deadline_s: float = ROUTE_DEADLINE_S,
+    speed_kmh: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Evaluate weather along a route departing at ``time``.
+
+    Without ``speed_kmh`` every point is evaluated at ``time``. With it, each
+    point is evaluated at the time a rider at that speed would pass it.
+    Points whose weather missed the deadline are listed in
+    ``unknown_points``; a route that would otherwise be "ok" is then
+    "partial". If no point gets weather, ForecastUnavailableError is raised.
+    """
+    ctx = _RouteContext(points, time, thresholds, speed_kmh)
+    weathers: List[Optional[Dict[str, Any]]] = [None] * len(points)
+    async for indices, cell_weathers in _iter_cell_weather(
+        points, time, concurrency, deadline_s, ctx.pass_ts
+    ):
+        if cell_weathers is not None:
+            for idx, weather in zip(indices, cell_weathers):
+                weathers[idx] = weather
+
+    known = [idx for idx, weather in enumerate(weathers) if weather is not None]
+    records: List[Optional[Dict[str, Any]]] = [None] * len(points)
+    for record in ctx.evaluate(known, [weathers[idx] for idx in known]):
+        records[record["index"]] = record
+    unknown = [idx for idx, weather in enumerate(weathers) if weather is None]
+    for record in ctx.evaluate(unknown, None):
+        records[record["index"]] = record
+
+    summary = _RouteSummary(ctx)
+    for record in records:
+        summary.add(record)
+    return {**summary.result(), "points": records}
+
+
+async def stream_route_weather(
+    points: List[Dict[str, float]],
+    time: datetime,
+    thresholds: WeatherLimits,
+    *,
+    concurrency: int = ROUTE_FETCH_CONCURRENCY,
+    deadline_s: float = ROUTE_DEADLINE_S,
+    speed_kmh: Optional[float] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield each point's record as soon as its grid cell is evaluated.
+
+    Point records carry ``"type": "point"`` and arrive in completion order,
+    not route order; the final record has ``"type": "summary"`` and the same
+    fields as ``evaluate_route_weather`` apart from ``points``.
+    """
+    ctx = _RouteContext(points, time, thresholds, speed_kmh)
+    summary = _RouteSummary(ctx)
+    async for indices, cell_weathers in _iter_cell_weather(
+        points, time, concurrency, deadline_s, ctx.pass_ts
+    ):
+        for record in ctx.evaluate(indices, cell_weathers):
+            summary.add(record)
+            yield {"type": "point", **record}
+    yield {"type": "summary", **summary.result()}
@@ -3,7 +3,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Sequence
+
+import numpy as np
 
 
 @dataclass
@@ -87,6 +89,71 @@ def evaluate_forecast_point(point: Dict, limits: Dict) -> List[Breach]:
     return out
 
 
+# (metric, limit key, breached when above the limit, severity, advice), in the
+# order evaluate_forecast_point reports them.
+_CHECKS = (
+    ("temp", "min_temperature", False, "warn",
+     "It will feel cold; consider thermal layers and gloves."),
+    ("temp", "max_temperature", True, "warn",
+     "It will be hot; hydrate well and wear breathable kit."),
+    ("wind_speed", "max_wind_speed", True, "warn",
+     "Wind is high; travel light, avoid loose bags, allow extra time."),
+    ("rain", "max_rain_intensity", True, "warn",
+     "Expect rain; waterproof jacket and mudguards recommended."),
+    ("uvi", "max_uv_index", True, "info",
+     "High UV; use sunscreen and glasses."),
+)
+
+
+def _column(values) -> np.ndarray:
+    return np.array(
+        [np.nan if v is None else float(v) for v in values], dtype=float
+    )
+
+
+def evaluate_forecast_batch(
+    points: Sequence[Dict], limits_list: Sequence[Dict]
+) -> List[List[List[Breach]]]:
+    """Evaluate every set of limits against the same forecast points.
+
+    Returns, per entry of ``limits_list``, the per-point breaches that
+    ``evaluate_forecast_point`` would give. Each check is one comparison of
+    the point column against the limit column, so riders sharing a forecast
+    cost a broadcast rather than a loop each.
+    """
+    out: List[List[List[Breach]]] = [
+        [[] for _ in points] for _ in limits_list
+    ]
+    if not points or not limits_list:
+        return out
+    columns: Dict[str, np.ndarray] = {}
+    for metric, key, above, severity, advice in _CHECKS:
+        if metric not in columns:
+            columns[metric] = _column(p.get(metric) for p in points)
+        values = columns[metric]
+        limits = _column(l.get(key) for l in limits_list)
+        with np.errstate(invalid="ignore"):
+            if above:
+                hits = values[None, :] > limits[:, None]
+            else:
+                hits = values[None, :] < limits[:, None]
+        for r, h in zip(*np.nonzero(hits)):
+            limit = float(limits[r])
+            sev = severity
+            if metric == "wind_speed" and values[h] > limit * 1.2:
+                sev = "alert"
+            out[r][h].append(
+                Breach(
+                    metric=metric,
+                    value=points[h][metric],
+                    limit=limit,
+                    severity=sev,
+                    advice=advice,
+                )
+            )
+    return out
+
+
 def summarize_breaches(hourly_breaches: List[List[Breach]]) -> str:
 
     flat = [b for lst in hourly_breaches for b in lst]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import OPENWEATHER_RATE_PER_S, OPENWEATHER_BURST, OPENWEATHER_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Upstream request classes; lower values are served first."""
+
+    ALERT = 0
+    INTERACTIVE = 1
+    SAMPLING = 2
+    HISTORY = 3
+
+
+class UpstreamShedError(Exception):
+    """Raised when the rate limiter drops a request instead of queueing it."""
+
+
+class RateLimitScheduler:
+    """Token bucket shared by all calls to one upstream, with priority lanes.
+
+    Callers that cannot take a token immediately wait in a bounded priority
+    queue. When the queue is full the lowest-priority waiter is shed with
+    ``UpstreamShedError``, or the new caller is if nothing queued ranks below it
+    (always, with ``max_queue=0``).
+    """
+
+    def __init__(
+        self,
+        rate_per_s: float,
+        burst: int,
+        max_queue: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate_per_s <= 0:
+            raise ValueError("rate_per_s must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.max_queue = max_queue
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._drainer: Optional[asyncio.Task] = None
+        self._stats: Dict[Priority, Dict[str, float]] = {
+            p: {"granted": 0, "shed": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+            for p in Priority
+        }
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def _record_grant(self, priority: Priority, waited: float) -> None:
+        lane = self._stats[priority]
+        lane["granted"] += 1
+        lane["wait_total_s"] += waited
+        lane["wait_max_s"] = max(lane["wait_max_s"], waited)
+
+    def _shed_lowest(self, priority: Priority) -> bool:
+        """Drop the lowest-priority waiter if it ranks below ``priority``."""
+        live = [w for w in self._waiters if not w[2].done()]
+        if not live:
+            return False
+        worst = max(live, key=lambda w: (w[0], w[1]))
+        if worst[0] <= priority:
+            return False
+        self._waiters.remove(worst)
+        heapq.heapify(self._waiters)
+        self._stats[Priority(worst[0])]["shed"] += 1
+        worst[2].set_exception(UpstreamShedError("Upstream request shed by rate limiter"))
+        return True
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> None:
+        self._refill()
+        self._waiters = [w for w in self._waiters if not w[2].done()]
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            self._record_grant(priority, 0.0)
+            return
+
+        if len(self._waiters) >= self.max_queue and not self._shed_lowest(priority):
+            self._stats[priority]["shed"] += 1
+            logger.warning("Shedding %s upstream request; queue full", priority.name)
+            raise UpstreamShedError("Upstream request shed by rate limiter")
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), fut))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        started = self._clock()
+        await fut
+        self._record_grant(priority, self._clock() - started)
+
+    async def _drain(self) -> None:
+        while self._waiters:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate_per_s)
+                continue
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            self._tokens -= 1
+            fut.set_result(None)
+
+    def stats(self) -> Dict[str, object]:
+        self._refill()
+        return {
+            "tokens": round(self._tokens, 3),
+            "queued": sum(1 for w in self._waiters if not w[2].done()),
+            "lanes": {p.name.lower(): dict(s) for p, s in self._stats.items()},
+        }
+
+
+# All OpenWeather traffic shares one API key, hence one bucket.
+weather_scheduler = RateLimitScheduler(
+    OPENWEATHER_RATE_PER_S, OPENWEATHER_BURST, OPENWEATHER_QUEUE_SIZE
+)
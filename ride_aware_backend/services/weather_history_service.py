@@ -10,31 +10,13 @@ from bson import ObjectId
 
 from models.weather_history import RouteWeatherSnapshot
 from services.db import weather_history_collection, routes_collection
-from services.weather_service import get_hourly_forecast
+from services.weather_service import get_hourly_forecast, ForecastUnavailableError
+from services.upstream_scheduler import Priority, UpstreamShedError
 from utils.commute_window import parse_time
 
 logger = logging.getLogger(__name__)
 
 
-def _haversine(a: Dict[str, float], b: Dict[str, float]) -> float:
-    import math
-    lat1 = math.radians(float(a["latitude"]))
-    lon1 = math.radians(float(a["longitude"]))
-    lat2 = math.radians(float(b["latitude"]))
-    lon2 = math.radians(float(b["longitude"]))
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
-    return 6371 * 2 * math.asin(math.sqrt(h))
-
-
-def _route_distance(points: List[Dict[str, float]]) -> float:
-    dist = 0.0
-    for i in range(len(points) - 1):
-        dist += _haversine(points[i], points[i + 1])
-    return dist
-
-
 def calculate_interval(start_time: str, end_time: str, distance_km: float) -> int:
     today = date.today()
     start_dt = datetime.combine(today, parse_time(start_time))
@@ -62,7 +44,11 @@ async def _record_snapshot(
     device_id: str, threshold_id: str, lat: float, lon: float, now: datetime
 ) -> None:
     """Fetch and store a single weather snapshot."""
-    weather = get_hourly_forecast(lat, lon, now)
+    try:
+        weather = await get_hourly_forecast(lat, lon, now, priority=Priority.HISTORY)
+    except (UpstreamShedError, ForecastUnavailableError) as e:
+        logger.info("Weather snapshot for %s unavailable (%s); skipping", threshold_id, e)
+        return
     snap = RouteWeatherSnapshot(
         device_id=device_id,
         threshold_id=threshold_id,
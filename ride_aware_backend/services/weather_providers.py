@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from config import (
+    WEATHER_PROVIDER,
+    WEATHER_RECORDINGS,
+    WEATHER_SYNTHETIC_SEED,
+    WEATHER_SYNTHETIC_LATENCY_MS,
+)
+from services.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+OPENWEATHER_URL = os.getenv(
+    "OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5/forecast"
+)
+OPENWEATHER_CURRENT_URL = os.getenv(
+    "OPENWEATHER_CURRENT_URL", "https://api.openweathermap.org/data/2.5/weather"
+)
+SLOT_SECONDS = 3 * 3600
+
+
+class MissingAPIKeyError(Exception):
+    """Raised when the OpenWeather API key is missing."""
+
+
+class ReplayMissError(LookupError):
+    """Raised when a replay provider has no recording for a request."""
+
+
+class WeatherProvider(ABC):
+    """Source of OpenWeather-shaped forecast and current-weather payloads.
+
+    ``fetch_forecast`` returns the ``list`` of 3-hour slots from the 5-day
+    forecast endpoint and ``fetch_current`` the body of the current-weather
+    endpoint, so parsing stays in the services whatever the backend.
+    """
+
+    name = "base"
+    # Only providers that spend real API quota go through the rate limiter.
+    rate_limited = False
+
+    @abstractmethod
+    async def fetch_forecast(self, lat: float, lon: float, slots: int) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def fetch_current(self, lat: float, lon: float) -> Dict:
+        ...
+
+
+class OpenWeatherProvider(WeatherProvider):
+    name = "openweather"
+    rate_limited = True
+
+    def _api_key(self) -> str:
+        api_key = os.getenv("OPENWEATHER_API_KEY")
+        if not api_key:
+            logger.error("OPENWEATHER_API_KEY environment variable not set")
+            raise MissingAPIKeyError("OPENWEATHER_API_KEY environment variable not set")
+        return api_key
+
+    async def fetch_forecast(self, lat: float, lon: float, slots: int) -> List[Dict]:
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": self._api_key(),
+            "units": "metric",
+            "cnt": slots,
+        }
+        response = await get_http_client().get(OPENWEATHER_URL, params=params)
+        logger.debug(
+            "Weather API response status: %s", getattr(response, "status_code", "unknown")
+        )
+        response.raise_for_status()
+        return response.json().get("list", [])
+
+    async def fetch_current(self, lat: float, lon: float) -> Dict:
+        params = {"lat": lat, "lon": lon, "appid": self._api_key(), "units": "metric"}
+        response = await get_http_client().get(OPENWEATHER_CURRENT_URL, params=params)
+        response.raise_for_status()
+        return response.json()
+
+
+class SyntheticProvider(WeatherProvider):
+    """Deterministic generated weather for offline load tests and benchmarks.
+
+    Values depend only on ``seed``, the rounded coordinate and the slot time,
+    and each call sleeps ``latency_s`` to stand in for the network.
+    """
+
+    name = "synthetic"
+
+    def __init__(
+        self,
+        seed: int = 0,
+        latency_s: float = 0.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.seed = seed
+        self.latency_s = latency_s
+        self._clock = clock
+        self.calls = 0
+
+    def _slot(self, lat: float, lon: float, dt: int) -> Dict:
+        rng = random.Random(f"{self.seed}:{lat:.4f}:{lon:.4f}:{dt}")
+        hour = (dt % 86400) / 3600
+        temp = 12 - abs(lat) / 10 + 7 * math.sin(2 * math.pi * (hour - 9) / 24)
+        slot = {
+            "dt": dt,
+            "main": {
+                "temp": round(temp + rng.uniform(-1.5, 1.5), 2),
+                "humidity": rng.randint(45, 95),
+            },
+            "wind": {
+                "speed": round(rng.uniform(0.5, 12.0), 2),
+                "deg": rng.randint(0, 359),
+            },
+            "clouds": {"all": rng.randint(0, 100)},
+            "visibility": rng.choice([10000, 10000, 8000, 4000]),
+        }
+        if rng.random() < 0.3:
+            slot["rain"] = {"3h": round(rng.uniform(0.1, 6.0), 2)}
+        return slot
+
+    async def _delay(self) -> None:
+        self.calls += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+    async def fetch_forecast(self, lat: float, lon: float, slots: int) -> List[Dict]:
+        await self._delay()
+        start = int(self._clock()) // SLOT_SECONDS * SLOT_SECONDS
+        return [self._slot(lat, lon, start + i * SLOT_SECONDS) for i in range(slots)]
+
+    async def fetch_current(self, lat: float, lon: float) -> Dict:
+        await self._delay()
+        return self._slot(lat, lon, int(self._clock()))
+
+
+def _recording_key(kind: str, lat: float, lon: float, slots: Optional[int] = None) -> str:
+    key = f"{kind}:{lat:.4f}:{lon:.4f}"
+    return f"{key}:{slots}" if slots is not None else key
+
+
+class FileRecordStore:
+    """Recorded payloads as one JSON file per request key under ``directory``."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    def _read(self, key: str):
+        path = self._path(key)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())["payload"]
+
+    def _write(self, key: str, payload) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path(key).write_text(json.dumps({"key": key, "payload": payload}))
+
+    async def load(self, key: str):
+        return await asyncio.to_thread(self._read, key)
+
+    async def save(self, key: str, payload) -> None:
+        await asyncio.to_thread(self._write, key, payload)
+
+
+class MongoRecordStore:
+    """Recorded payloads in a Mongo collection keyed by request key."""
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+
+    async def load(self, key: str):
+        doc = await self.collection.find_one({"_id": key})
+        return doc.get("payload") if doc else None
+
+    async def save(self, key: str, payload) -> None:
+        await self.collection.update_one(
+            {"_id": key}, {"$set": {"payload": payload}}, upsert=True
+        )
+
+
+class RecordingProvider(WeatherProvider):
+    """Pass requests to ``inner`` and record every response into ``store``."""
+
+    name = "record"
+
+    def __init__(self, inner: WeatherProvider, store) -> None:
+        self.inner = inner
+        self.store = store
+        self.rate_limited = inner.rate_limited
+
+    async def fetch_forecast(self, lat: float, lon: float, slots: int) -> List[Dict]:
+        payload = await self.inner.fetch_forecast(lat, lon, slots)
+        await self.store.save(_recording_key("forecast", lat, lon, slots), payload)
+        return payload
+
+    async def fetch_current(self, lat: float, lon: float) -> Dict:
+        payload = await self.inner.fetch_current(lat, lon)
+        await self.store.save(_recording_key("current", lat, lon), payload)
+        return payload
+
+
+class ReplayProvider(WeatherProvider):
+    """Serve responses captured earlier by a ``RecordingProvider``."""
+
+    name = "replay"
+
+    def __init__(self, store) -> None:
+        self.store = store
+
+    async def _load(self, key: str):
+        payload = await self.store.load(key)
+        if payload is None:
+            raise ReplayMissError(f"No recorded response for {key}")
+        return payload
+
+    async def fetch_forecast(self, lat: float, lon: float, slots: int) -> List[Dict]:
+        return await self._load(_recording_key("forecast", lat, lon, slots))
+
+    async def fetch_current(self, lat: float, lon: float) -> Dict:
+        return await self._load(_recording_key("current", lat, lon))
+
+
+def _record_store(location: str):
+    if location == "mongo":
+        from services.db import db
+
+        return MongoRecordStore(db["weather_recordings"])
+    return FileRecordStore(location)
+
+
+def build_provider(name: str = WEATHER_PROVIDER) -> WeatherProvider:
+    if name == "openweather":
+        return OpenWeatherProvider()
+    if name == "synthetic":
+        return SyntheticProvider(
+            seed=WEATHER_SYNTHETIC_SEED, latency_s=WEATHER_SYNTHETIC_LATENCY_MS / 1000
+        )
+    if name == "replay":
+        return ReplayProvider(_record_store(WEATHER_RECORDINGS))
+    if name == "record":
+        return RecordingProvider(OpenWeatherProvider(), _record_store(WEATHER_RECORDINGS))
+    raise ValueError(f"Unknown WEATHER_PROVIDER {name!r}")
+
+
+_provider: Optional[WeatherProvider] = None
+
+
+def get_weather_provider() -> WeatherProvider:
+    global _provider
+    if _provider is None:
+        _provider = build_provider()
+        logger.info("Using %s weather provider", _provider.name)
+    return _provider
+
+
+def set_weather_provider(provider: Optional[WeatherProvider]) -> None:
+    """Swap the process-wide provider; ``None`` rebuilds it from config."""
+    global _provider
+    _provider = provider
@@ -1,111 +1,269 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from datetime import datetime
-import os
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
 
-import requests
+import httpx
 
+from config import (
+    FORECAST_GRID_DEG,
+    FORECAST_CACHE_SIZE,
+    FORECAST_RUN_HOURS,
+    FORECAST_BREAKER_FAILURES,
+    FORECAST_BREAKER_RESET_S,
+    FORECAST_MAX_STALE_S,
+)
+from services.weather_providers import (
+    MissingAPIKeyError,
+    ReplayMissError,
+    get_weather_provider,
+)
+from services.forecast_cache_service import load_forecast_run, save_forecast_run
+from services.forecast_series import ForecastSeries
+from services.upstream_scheduler import Priority, UpstreamShedError, weather_scheduler
+from utils.forecast_grid import (
+    GridCell,
+    grid_cell,
+    cell_center,
+    forecast_run,
+    next_forecast_run,
+)
+from utils.circuit_breaker import CircuitBreaker
+from utils.single_flight import SingleFlight
+from utils.ttl_cache import TTLCache
 
-class MissingAPIKeyError(Exception):
-    """Raised when the OpenWeather API key is missing."""
 
-OPENWEATHER_URL = os.getenv(
-    "OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5/forecast"
-)
+class ForecastUnavailableError(Exception):
+    """Raised when the provider circuit is open and no forecast is cached."""
+
+# The 5-day/3-hour endpoint returns at most 40 slots.
+FORECAST_SLOTS = 40
 logger = logging.getLogger(__name__)
 
+# Parsed forecast series per grid cell, kept until the provider's next run.
+_forecast_cache = TTLCache(maxsize=FORECAST_CACHE_SIZE)
+# Concurrent misses for the same cell and run share one upstream fetch.
+_forecast_flight = SingleFlight()
+_forecast_breaker = CircuitBreaker(
+    "openweather-forecast", FORECAST_BREAKER_FAILURES, FORECAST_BREAKER_RESET_S
+)
+_background_refreshes: set = set()
+_stale_stats = {"served": 0, "refresh_failures": 0}
 
-def get_hourly_forecast(lat: float, lon: float, target_time: datetime) -> Dict:
 
-    logger.info(
-        "Fetching weather forecast for lat=%s lon=%s at %s",
-        lat,
-        lon,
-        target_time,
-    )
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    if not api_key:
-        logger.error("OPENWEATHER_API_KEY environment variable not set")
-        raise MissingAPIKeyError("OPENWEATHER_API_KEY environment variable not set")
-
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "appid": api_key,
-        "units": "metric",
-        "cnt": 8,
+def _parse_slot(item: Dict) -> Dict:
+    rain_data = item.get("rain")
+    if isinstance(rain_data, dict):
+        rain_data = rain_data.get("3h", rain_data.get("1h"))
+    return {
+        "dt": item.get("dt", 0),
+        "wind_speed": item.get("wind", {}).get("speed"),
+        "wind_deg": item.get("wind", {}).get("deg"),
+        "rain": rain_data,
+        "humidity": item.get("main", {}).get("humidity"),
+        "temp": item.get("main", {}).get("temp"),
+        "visibility": item.get("visibility"),
+        "uvi": item.get("uvi"),
+        "clouds": item.get("clouds", {}).get("all"),
     }
-    response = requests.get(OPENWEATHER_URL, params=params)
-    logger.debug(
-        "Weather API response status: %s", getattr(response, "status_code", "unknown")
+
+
+async def _fetch_forecast_list(
+    lat: float, lon: float, slots: int, priority: Priority
+) -> List[Dict]:
+    provider = get_weather_provider()
+    if not _forecast_breaker.allow():
+        raise ForecastUnavailableError("Weather provider circuit is open")
+    if provider.rate_limited:
+        try:
+            await weather_scheduler.acquire(priority)
+        except BaseException:
+            _forecast_breaker.release()
+            raise
+
+    healthy = False
+    try:
+        items = await provider.fetch_forecast(lat, lon, slots)
+        healthy = True
+    except httpx.HTTPStatusError as e:
+        healthy = e.response.status_code < 500
+        raise
+    except (MissingAPIKeyError, ReplayMissError):
+        # Configuration problems say nothing about the provider's health.
+        healthy = True
+        raise
+    finally:
+        if healthy:
+            _forecast_breaker.record_success()
+        else:
+            _forecast_breaker.record_failure()
+    return items
+
+
+async def get_forecast_series(
+    lat: float, lon: float, priority: Priority = Priority.INTERACTIVE
+) -> ForecastSeries:
+    """Return the full forecast series for the grid cell containing lat/lon.
+
+    Once the cached series has expired it is still served, labelled as stale,
+    while a background refresh runs, as long as it is younger than
+    FORECAST_MAX_STALE_S or the provider circuit is open. The stale series is
+    also the fallback when a blocking refresh fails.
+    """
+    cell = grid_cell(lat, lon, FORECAST_GRID_DEG)
+    cached = _forecast_cache.get(cell)
+    if cached is not None:
+        logger.debug("Forecast cache hit for cell %s", cell)
+        return cached
+
+    run = forecast_run(datetime.now(timezone.utc), FORECAST_RUN_HOURS)
+    stale_entry = _forecast_cache.get_stale(cell)
+    stale = stale_entry[0] if stale_entry is not None else None
+    if stale is not None and (
+        stale.age_seconds() <= FORECAST_MAX_STALE_S
+        or _forecast_breaker.state == "open"
+    ):
+        _revalidate_in_background(cell, run, priority)
+        return _serve_stale(stale)
+
+    try:
+        return await _forecast_flight.do(
+            (cell, run), lambda: _refresh_cell(cell, run, priority)
+        )
+    except (httpx.HTTPError, ForecastUnavailableError, UpstreamShedError):
+        if stale is None:
+            raise
+        logger.warning("Forecast refresh for cell %s failed; serving stale", cell)
+        return _serve_stale(stale)
+
+
+def _serve_stale(series: ForecastSeries) -> ForecastSeries:
+    _stale_stats["served"] += 1
+    return series.as_stale()
+
+
+def _revalidate_in_background(cell: GridCell, run: datetime, priority: Priority) -> None:
+    if _forecast_flight.in_flight((cell, run)) or _forecast_breaker.state == "open":
+        return
+    task = asyncio.ensure_future(
+        _forecast_flight.do((cell, run), lambda: _refresh_cell(cell, run, priority))
     )
-    response.raise_for_status()
-    forecast_list = response.json().get("list", [])
-    if not forecast_list:
-        logger.error("No forecast data available from weather service")
-        raise ValueError("No forecast data available")
+    _background_refreshes.add(task)
+    task.add_done_callback(_finish_background_refresh)
 
-    target_ts = int(target_time.timestamp())
-    closest = min(forecast_list, key=lambda h: abs(h.get("dt", 0) - target_ts))
 
-    rain_data = closest.get("rain")
-    if isinstance(rain_data, dict):
-        rain_data = rain_data.get("3h")
+def _finish_background_refresh(task: asyncio.Task) -> None:
+    _background_refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        _stale_stats["refresh_failures"] += 1
+        logger.warning("Background forecast refresh failed: %s", task.exception())
 
-    data = {
-        "wind_speed": closest.get("wind", {}).get("speed"),
-        "wind_deg": closest.get("wind", {}).get("deg"),
-        "rain": rain_data,
-        "humidity": closest.get("main", {}).get("humidity"),
-        "temp": closest.get("main", {}).get("temp"),
-        "visibility": closest.get("visibility"),
-        "uvi": closest.get("uvi"),
-        "clouds": closest.get("clouds", {}).get("all"),
+
+def _to_epoch(value) -> Optional[float]:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return None
+
+
+async def _refresh_cell(
+    cell: GridCell, run: datetime, priority: Priority
+) -> ForecastSeries:
+    expires_at = next_forecast_run(run, FORECAST_RUN_HOURS)
+    stored = await load_forecast_run(cell, run, FORECAST_SLOTS)
+    if stored is not None:
+        logger.debug("Forecast store hit for cell %s run %s", cell, run)
+        series = ForecastSeries.from_records(
+            stored.get("forecasts") or [], _to_epoch(stored.get("fetched_at"))
+        )
+    else:
+        cell_lat, cell_lon = cell_center(cell, FORECAST_GRID_DEG)
+        items = await _fetch_forecast_list(
+            cell_lat, cell_lon, FORECAST_SLOTS, priority
+        )
+        series = ForecastSeries.from_records(_parse_slot(item) for item in items)
+        if len(series):
+            await save_forecast_run(
+                cell,
+                cell_lat,
+                cell_lon,
+                run,
+                FORECAST_SLOTS,
+                series.to_records(),
+                expires_at,
+                datetime.fromtimestamp(series.fetched_at, timezone.utc),
+            )
+    if len(series):
+        _forecast_cache.set(cell, series, expires_at=expires_at.timestamp())
+    return series
+
+
+def forecast_stats() -> Dict[str, Dict]:
+    return {
+        "cache": _forecast_cache.stats(),
+        "single_flight": _forecast_flight.stats(),
+        "upstream": weather_scheduler.stats(),
+        "breaker": _forecast_breaker.stats(),
+        "stale": dict(_stale_stats),
     }
+
+
+async def get_hourly_forecast(
+    lat: float,
+    lon: float,
+    target_time: datetime,
+    priority: Priority = Priority.INTERACTIVE,
+) -> Dict:
+
+    logger.info(
+        "Fetching weather forecast for lat=%s lon=%s at %s",
+        lat,
+        lon,
+        target_time,
+    )
+    data = (await get_forecasts_at(lat, lon, [target_time], priority))[0]
     logger.debug("Selected weather data: %s", data)
     return data
 
 
-def get_next_hours_forecast(lat: float, lon: float, hours: int = 6):
+async def get_forecasts_at(
+    lat: float,
+    lon: float,
+    target_times: Sequence[datetime],
+    priority: Priority = Priority.INTERACTIVE,
+) -> List[Dict]:
+    """Interpolate the cell's cached series at each of ``target_times``."""
+    series = await get_forecast_series(lat, lon, priority)
+    if not len(series):
+        logger.error("No forecast data available from weather service")
+        raise ValueError("No forecast data available")
+    return series.at_many(target_times)
+
+
+async def get_next_hours_forecast(
+    lat: float, lon: float, hours: int = 6, priority: Priority = Priority.INTERACTIVE
+):
     """Return forecast snapshots for the upcoming ``hours`` hours."""
     logger.info(
         "Fetching next %s hours forecast for lat=%s lon=%s", hours, lat, lon
     )
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    if not api_key:
-        logger.error("OPENWEATHER_API_KEY environment variable not set")
-        raise MissingAPIKeyError("OPENWEATHER_API_KEY environment variable not set")
-
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "appid": api_key,
-        "units": "metric",
-        "cnt": hours,
-    }
-    response = requests.get(OPENWEATHER_URL, params=params)
-    logger.debug(
-        "Weather API response status: %s", getattr(response, "status_code", "unknown")
-    )
-    response.raise_for_status()
-    forecast_list = response.json().get("list", [])[:hours]
+    series = await get_forecast_series(lat, lon, priority)
+    forecast_list = series.upcoming(datetime.now(timezone.utc).timestamp(), hours)
     results = []
     for item in forecast_list:
-        rain_data = item.get("rain")
-        if isinstance(rain_data, dict):
-            rain_data = rain_data.get("3h") or rain_data.get("1h")
         results.append(
             {
                 "time": datetime.fromtimestamp(item.get("dt", 0)).isoformat(),
-                "wind_speed": item.get("wind", {}).get("speed"),
-                "wind_deg": item.get("wind", {}).get("deg"),
-                "rain": rain_data,
-                "humidity": item.get("main", {}).get("humidity"),
-                "temp": item.get("main", {}).get("temp"),
+                "wind_speed": item.get("wind_speed"),
+                "wind_deg": item.get("wind_deg"),
+                "rain": item.get("rain"),
+                "humidity": item.get("humidity"),
+                "temp": item.get("temp"),
+                **{k: item[k] for k in ("stale", "forecast_age_s") if k in item},
             }
         )
     logger.debug("Next hours forecast data: %s", results)
     return results
-
@@ -1,17 +1,51 @@
+import asyncio
 import logging
-import os
-from datetime import datetime
+from datetime import datetime, timezone
 from math import radians, sin, cos, sqrt, asin
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 
 import httpx
+import numpy as np
+from pymongo import UpdateOne
 
+from config import (
+    FORECAST_GRID_DEG,
+    WIND_FETCH_CONCURRENCY,
+    WIND_DEADLINE_S,
+    WIND_SAMPLE_SPACING_M,
+    WIND_CACHE_SIZE,
+    WIND_CACHE_TTL_S,
+    WIND_RECORD_BATCH_SIZE,
+    WIND_RECORD_FLUSH_S,
+)
 from models.wind import Coordinate, RouteRequest, WindResult
-from services.db import db
+from services.db import (
+    routes_collection,
+    wind_directions_collection,
+    wind_routes_collection,
+)
+from services.route_geometry import (
+    SUMMARY_VERSION,
+    coords_hash,
+    route_summary,
+    sample_polyline,
+    simplify_indices,
+)
+from services.upstream_scheduler import Priority, weather_scheduler
+from services.weather_providers import MissingAPIKeyError, get_weather_provider
+from utils.forecast_grid import grid_cell, cell_center
+from utils.single_flight import SingleFlight
+from utils.batch_writer import BatchWriter
+from utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
-wind_collection = db["wind_directions"]
+# Current wind per grid cell; riders sharing a corridor share lookups.
+_wind_cache = TTLCache(maxsize=WIND_CACHE_SIZE, ttl=WIND_CACHE_TTL_S)
+_wind_flight = SingleFlight()
+# Routes written recently enough that records only need their hash. Set
+# after the write succeeds: a queued record may still be dropped.
+_known_routes = TTLCache(maxsize=WIND_CACHE_SIZE, ttl=3600)
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -24,6 +58,7 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
 
 
 def sample_route_points(points: List[Coordinate]) -> List[Coordinate]:
+    """Reference segment walk; ``sample_route_arrays`` is used for requests."""
     sampled: List[Coordinate] = []
     if not points or len(points) < 2:
         return sampled
@@ -44,62 +79,217 @@ def sample_route_points(points: List[Coordinate]) -> List[Coordinate]:
     return sampled
 
 
+def sample_route_arrays(
+    lat: Sequence[float], lon: Sequence[float], spacing_m: float = WIND_SAMPLE_SPACING_M
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sample a polyline every ``spacing_m`` metres, as lat/lon arrays."""
+    sample_lat, sample_lon, _ = sample_polyline(
+        np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64), spacing_m
+    )
+    return sample_lat, sample_lon
+
+
+def _with_route_end(
+    sample_lat: np.ndarray,
+    sample_lon: np.ndarray,
+    end_lat: float,
+    end_lon: float,
+    spacing_m: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Add the route's end point unless a sample already lies near it."""
+    if len(sample_lat) and (
+        haversine_distance(sample_lat[-1], sample_lon[-1], end_lat, end_lon)
+        <= spacing_m / 2
+    ):
+        return sample_lat, sample_lon
+    return np.append(sample_lat, end_lat), np.append(sample_lon, end_lon)
+
+
 async def get_wind_direction(lat: float, lon: float) -> Optional[float]:
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    if not api_key:
-        logger.warning("OPENWEATHER_API_KEY environment variable not set")
-        return None
-    url = "https://api.openweathermap.org/data/2.5/weather"
-    params = {"lat": lat, "lon": lon, "appid": api_key}
+    """Current wind direction for the grid cell containing lat/lon.
+
+    Lookups are cached per cell for WIND_CACHE_TTL_S; failed lookups are not
+    cached so the next request retries them.
+    """
+    cell = grid_cell(lat, lon, FORECAST_GRID_DEG)
+    cached = _wind_cache.get(cell)
+    if cached is not None:
+        return cached
+    wind_deg = await _wind_flight.do(
+        cell, lambda: _fetch_wind_direction(*cell_center(cell, FORECAST_GRID_DEG))
+    )
+    if wind_deg is not None:
+        _wind_cache.set(cell, wind_deg)
+    return wind_deg
+
+
+def wind_stats() -> dict:
+    return {
+        "cache": _wind_cache.stats(),
+        "single_flight": _wind_flight.stats(),
+        "record_writer": wind_record_writer.stats(),
+    }
+
+
+async def _fetch_wind_direction(lat: float, lon: float) -> Optional[float]:
+    provider = get_weather_provider()
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            resp = await client.get(url, params=params)
-        if resp.status_code != 200:
-            logger.warning(
-                "Wind API request failed for (%s,%s) with status %s",
-                lat,
-                lon,
-                resp.status_code,
-            )
-            return None
-        data = resp.json()
+        if provider.rate_limited:
+            await weather_scheduler.acquire(Priority.SAMPLING)
+        data = await provider.fetch_current(lat, lon)
         return data.get("wind", {}).get("deg")
+    except MissingAPIKeyError as e:
+        logger.warning("%s", e)
+        return None
+    except httpx.HTTPStatusError as e:
+        logger.warning(
+            "Wind API request failed for (%s,%s) with status %s",
+            lat,
+            lon,
+            e.response.status_code,
+        )
+        return None
     except Exception as e:
         logger.warning("Error fetching wind data for (%s,%s): %s", lat, lon, e)
         return None
 
 
-async def compute_wind_directions(req: RouteRequest) -> List[WindResult]:
-    sample_points = sample_route_points(req.points)
-    if req.points:
-        last = req.points[-1]
-        if sample_points:
-            if (
-                haversine_distance(
-                    sample_points[-1].lat, sample_points[-1].lon, last.lat, last.lon
-                )
-                > 500
-            ):
-                sample_points.append(last)
-        else:
-            sample_points.append(last)
-
-    results: List[WindResult] = []
-    for coord in sample_points:
-        wind_deg = await get_wind_direction(coord.lat, coord.lon)
-        if wind_deg is not None:
-            results.append(WindResult(lat=coord.lat, lon=coord.lon, wind_deg=wind_deg))
+async def _saved_route_samples(device_id: str, spacing_m: float):
+    """Return route and sample lat/lon arrays for a device's saved route.
+
+    The route is the simplified polyline stored with it, so the full
+    ``route_points`` are only read for routes saved before summaries existed.
+    """
+    doc = await routes_collection.find_one({"device_id": device_id}, {"geometry": 1})
+    if not doc:
+        return None
+    summary = doc.get("geometry")
+    if not summary or summary.get("version") != SUMMARY_VERSION:
+        doc = await routes_collection.find_one(
+            {"device_id": device_id}, {"route_points": 1}
+        )
+        if not doc or not doc.get("route_points"):
+            return None
+        summary = route_summary(doc)
+    points = summary["simplified_points"]
+    if not points:
+        return None
+    route_lat = np.array([float(p["latitude"]) for p in points])
+    route_lon = np.array([float(p["longitude"]) for p in points])
+    if summary.get("sample_spacing_m") != spacing_m:
+        return (route_lat, route_lon, *sample_route_arrays(route_lat, route_lon, spacing_m))
+    samples = summary["samples"]
+    sample_lat = np.array([s["latitude"] for s in samples], dtype=np.float64)
+    sample_lon = np.array([s["longitude"] for s in samples], dtype=np.float64)
+    return route_lat, route_lon, sample_lat, sample_lon
 
+
+async def _sample_winds(
+    lats: List[float],
+    lons: List[float],
+    concurrency: int = WIND_FETCH_CONCURRENCY,
+    deadline_s: float = WIND_DEADLINE_S,
+) -> List[Optional[float]]:
+    """Look up wind at every coordinate concurrently, in route order.
+
+    At most ``concurrency`` lookups run at once; any still running after
+    ``deadline_s`` are cancelled and come back as ``None`` like failures do.
+    """
+    if not lats:
+        return []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch(lat: float, lon: float) -> Optional[float]:
+        async with sem:
+            return await get_wind_direction(lat, lon)
+
+    tasks = [asyncio.ensure_future(fetch(lat, lon)) for lat, lon in zip(lats, lons)]
+    done, pending = await asyncio.wait(tasks, timeout=deadline_s)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(
+            "Wind deadline of %ss hit with %s of %s samples pending",
+            deadline_s,
+            len(pending),
+            len(tasks),
+        )
+    return [task.result() if task in done else None for task in tasks]
+
+
+async def compute_wind_directions(
+    req: RouteRequest, spacing_m: float = WIND_SAMPLE_SPACING_M
+) -> List[WindResult]:
+    saved = (
+        await _saved_route_samples(req.device_id, spacing_m) if req.device_id else None
+    )
+    if saved is not None:
+        route_lat, route_lon, sample_lat, sample_lon = saved
+    else:
+        route_lat = np.array([p.lat for p in req.points], dtype=np.float64)
+        route_lon = np.array([p.lon for p in req.points], dtype=np.float64)
+        lat, lon = route_lat, route_lon
+        if req.simplify_tolerance_m:
+            kept = simplify_indices(lat, lon, req.simplify_tolerance_m)
+            lat, lon = lat[kept], lon[kept]
+        sample_lat, sample_lon = sample_route_arrays(lat, lon, spacing_m)
+    if len(route_lat):
+        sample_lat, sample_lon = _with_route_end(
+            sample_lat, sample_lon, route_lat[-1], route_lon[-1], spacing_m
+        )
+
+    lats, lons = sample_lat.tolist(), sample_lon.tolist()
+    winds = await _sample_winds(lats, lons)
+    results = [
+        WindResult(lat=lat, lon=lon, wind_deg=wind_deg)
+        for lat, lon, wind_deg in zip(lats, lons, winds)
+        if wind_deg is not None
+    ]
+
+    _record_winds(route_lat.tolist(), route_lon.tolist(), results)
+    return results
+
+
+def _record_winds(lats: List[float], lons: List[float], results: List[WindResult]) -> None:
+    """Queue a sampling record; the route itself is stored once per hash.
+
+    Records carry the route points until one of them has been written.
+    """
+    route_hash = coords_hash(lats, lons)
+    route = None
+    if _known_routes.get(route_hash) is None:
+        route = [{"lat": lat, "lon": lon} for lat, lon in zip(lats, lons)]
     record = {
-        "route_points": [
-            {"lat": p.lat, "lon": p.lon} for p in req.points
-        ],
-        "sampled_winds": [r.dict() for r in results],
-        "timestamp": datetime.now(),
+        "route_hash": route_hash,
+        "sampled_winds": [r.model_dump() for r in results],
+        "timestamp": datetime.now(timezone.utc),
     }
-    try:
-        await wind_collection.insert_one(record)
-    except Exception as e:
-        logger.warning("Failed to store wind data: %s", e)
+    wind_record_writer.add((record, route))
 
-    return results
+
+async def _flush_wind_records(batch: List[tuple]) -> None:
+    now = datetime.now(timezone.utc)
+    routes = {record["route_hash"]: points for record, points in batch if points}
+    if routes:
+        await wind_routes_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": route_hash},
+                    {
+                        "$setOnInsert": {"route_points": points, "created_at": now},
+                        "$set": {"last_seen_at": now},
+                    },
+                    upsert=True,
+                )
+                for route_hash, points in routes.items()
+            ],
+            ordered=False,
+        )
+        for route_hash in routes:
+            _known_routes.set(route_hash, True)
+    await wind_directions_collection.insert_many([record for record, _ in batch], ordered=False)
+
+
+wind_record_writer = BatchWriter(
+    "wind-records", _flush_wind_records, WIND_RECORD_BATCH_SIZE, WIND_RECORD_FLUSH_S
+)
@@ -16,12 +16,70 @@ def test_save_user_route(monkeypatch):
     )
 
     dummy_result = object()
-    collection = type("C", (), {"update_one": AsyncMock(return_value=dummy_result)})()
+    collection = type(
+        "C",
+        (),
+        {
+            "find_one": AsyncMock(return_value=None),
+            "update_one": AsyncMock(return_value=dummy_result),
+        },
+    )()
     monkeypatch.setattr(route_controller, "routes_collection", collection)
 
     result = asyncio.run(route_controller.save_user_route(route))
     collection.update_one.assert_called_once()
     assert result == {"status": "ok", "device_id": "device123"}
+    stored = collection.update_one.call_args.args[1]["$set"]
+    assert stored["geometry"]["total_m"] == 0
+    assert stored["geometry"]["samples"] == []
+
+
+def _long_route():
+    return RouteModel(
+        device_id="device123",
+        route_name="Route",
+        start_location=GeoPoint(latitude=51, longitude=0),
+        end_location=GeoPoint(latitude=51.03, longitude=0),
+        route_points=[
+            GeoPoint(latitude=51, longitude=0),
+            GeoPoint(latitude=51.03, longitude=0),
+        ],
+    )
+
+
+def test_save_user_route_stores_geometry_summary(monkeypatch):
+    collection = type(
+        "C",
+        (),
+        {"find_one": AsyncMock(return_value=None), "update_one": AsyncMock()},
+    )()
+    monkeypatch.setattr(route_controller, "routes_collection", collection)
+
+    asyncio.run(route_controller.save_user_route(_long_route()))
+
+    geometry = collection.update_one.call_args.args[1]["$set"]["geometry"]
+    assert geometry["total_m"] == pytest.approx(3336, rel=0.01)
+    assert [s["distance_m"] for s in geometry["samples"]] == [1000, 2000, 3000]
+    assert geometry["simplified_points"] == [
+        {"latitude": 51.0, "longitude": 0.0},
+        {"latitude": 51.03, "longitude": 0.0},
+    ]
+
+
+def test_save_user_route_keeps_geometry_when_points_unchanged(monkeypatch):
+    route = _long_route()
+    points = route.model_dump(mode="json")["route_points"]
+    existing = {"geometry": route_controller.build_route_summary(points)}
+    collection = type(
+        "C",
+        (),
+        {"find_one": AsyncMock(return_value=existing), "update_one": AsyncMock()},
+    )()
+    monkeypatch.setattr(route_controller, "routes_collection", collection)
+
+    asyncio.run(route_controller.save_user_route(route))
+
+    assert "geometry" not in collection.update_one.call_args.args[1]["$set"]
 
 
 def test_get_user_route(monkeypatch):
@@ -1,9 +1,11 @@
+import json
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 from routes import forecast
 from services.weather_service import MissingAPIKeyError
+from services.upstream_scheduler import UpstreamShedError
 
 
 def test_forecast_success(monkeypatch):
@@ -43,7 +45,7 @@ def test_forecast_missing_api_key(monkeypatch):
 
 
 def test_route_forecast(monkeypatch):
-    async def fake_eval_route(points, time, thresholds):
+    async def fake_eval_route(points, time, thresholds, speed_kmh=None):
         return {
             "status": "ok",
             "issues": [],
@@ -93,3 +95,110 @@ def test_forecast_next(monkeypatch):
     )
     assert resp.status_code == 200
     assert resp.json()[0]["temp"] == 20
+
+
+def test_forecast_shed_returns_503(monkeypatch):
+    async def fake_get_forecast(lat: float, lon: float, time):
+        raise UpstreamShedError("Upstream request shed by rate limiter")
+
+    monkeypatch.setattr(forecast, "get_forecast", fake_get_forecast)
+
+    app = FastAPI()
+    app.include_router(forecast.router)
+    client = TestClient(app)
+
+    resp = client.get(
+        "/api/forecast",
+        params={"lat": 1.0, "lon": 2.0, "time": "2024-01-01T08:00:00"},
+    )
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "5"
+
+
+def test_route_forecast_time_aware_uses_default_speed(monkeypatch):
+    seen = {}
+
+    async def fake_eval_route(points, time, thresholds, speed_kmh=None):
+        seen["speed_kmh"] = speed_kmh
+        return {"status": "ok", "points": []}
+
+    monkeypatch.setattr(forecast, "evaluate_route", fake_eval_route)
+    app = FastAPI()
+    app.include_router(forecast.router)
+    client = TestClient(app)
+    body = {
+        "points": [{"latitude": 1.0, "longitude": 2.0}],
+        "time": "2024-01-01T08:00:00",
+        "time_aware": True,
+        "thresholds": {
+            "max_wind_speed": 10,
+            "max_rain_intensity": 5,
+            "max_humidity": 80,
+            "min_temperature": 0,
+            "max_temperature": 30,
+        },
+    }
+
+    assert client.post("/api/forecast/route", json=body).status_code == 200
+    assert seen["speed_kmh"] == forecast.ROUTE_SPEED_KMH
+
+    body["speed_kmh"] = 25
+    client.post("/api/forecast/route", json=body)
+    assert seen["speed_kmh"] == 25
+
+
+def test_route_forecast_streams_ndjson(monkeypatch):
+    async def fake_stream(points, time, thresholds, speed_kmh=None):
+        yield {"type": "point", "index": 1}
+        yield {"type": "point", "index": 0}
+        yield {"type": "summary", "status": "ok", "unknown_points": []}
+
+    monkeypatch.setattr(forecast, "stream_route", fake_stream)
+    app = FastAPI()
+    app.include_router(forecast.router)
+    client = TestClient(app)
+    body = {
+        "points": [{"latitude": 1.0, "longitude": 2.0}, {"latitude": 1.1, "longitude": 2.0}],
+        "time": "2024-01-01T08:00:00",
+        "thresholds": {
+            "max_wind_speed": 10,
+            "max_rain_intensity": 5,
+            "max_humidity": 80,
+            "min_temperature": 0,
+            "max_temperature": 30,
+        },
+    }
+
+    resp = client.post("/api/forecast/route?stream=ndjson", json=body)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["type"] for r in records] == ["point", "point", "summary"]
+
+    resp = client.post("/api/forecast/route?stream=sse", json=body)
+    assert resp.text.startswith('event: point\ndata: {"type": "point", "index": 1}\n\n')
+
+
+def test_route_forecast_stream_shed_before_first_record_is_503(monkeypatch):
+    async def fake_stream(points, time, thresholds, speed_kmh=None):
+        raise UpstreamShedError("queue full")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(forecast, "stream_route", fake_stream)
+    app = FastAPI()
+    app.include_router(forecast.router)
+    client = TestClient(app)
+    body = {
+        "points": [{"latitude": 1.0, "longitude": 2.0}],
+        "time": "2024-01-01T08:00:00",
+        "thresholds": {
+            "max_wind_speed": 10,
+            "max_rain_intensity": 5,
+            "max_humidity": 80,
+            "min_temperature": 0,
+            "max_temperature": 30,
+        },
+    }
+
+    resp = client.post("/api/forecast/route?stream=ndjson", json=body)
+    assert resp.status_code == 503
@@ -60,3 +60,13 @@ def test_get_current_threshold(monkeypatch):
     response = client.get("/thresholds/device123/current")
     assert response.status_code == 200
     assert response.json()["device_id"] == "device123"
+
+
+def test_device_jobs(monkeypatch):
+    async def fake_get_device_jobs(device_id):
+        return {"device_id": device_id, "pending": 2, "by_kind": {}}
+
+    monkeypatch.setattr(threshold_route, "get_device_jobs", fake_get_device_jobs)
+    response = client.get("/thresholds/device123/jobs")
+    assert response.status_code == 200
+    assert response.json()["pending"] == 2
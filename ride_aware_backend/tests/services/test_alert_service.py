@@ -43,12 +43,134 @@ def test_schedule_existing_alerts(monkeypatch):
 
     monkeypatch.setattr(alert_service, "thresholds_collection", Collection())
 
-    pre = AsyncMock()
-    rem = AsyncMock()
-    monkeypatch.setattr(alert_service, "schedule_pre_route_alert", pre)
-    monkeypatch.setattr(alert_service, "schedule_feedback_reminder", rem)
+    scheduler = AsyncMock()
+    scheduler.schedule_missing.return_value = 4
+    monkeypatch.setattr(alert_service, "job_scheduler", scheduler)
 
     asyncio.run(alert_service.schedule_existing_alerts())
 
-    assert pre.await_count == len(docs)
-    assert rem.await_count == len(docs)
+    # Both kinds for every threshold, in one bulk insert.
+    (jobs,) = scheduler.schedule_missing.await_args.args
+    assert scheduler.schedule_missing.await_count == 1
+    assert sorted(kind for kind, *_ in jobs) == ["feedback_reminder"] * 2 + ["pre_route_alert"] * 2
+    assert all(fields["device_id"] == "device1" for *_, fields in jobs)
+    scheduler.schedule.assert_not_awaited()
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+
+def test_pre_route_alerts_fetch_one_forecast_per_cell(monkeypatch):
+    today = date.today().isoformat()
+    docs = []
+    for i, (lat, max_wind) in enumerate([(51.45, 5), (51.45, 50), (40.0, 5)]):
+        doc = _threshold_doc(today)
+        doc["device_id"] = f"device{i}"
+        doc["office_location"] = {"latitude": lat, "longitude": -2.6}
+        doc["weather_limits"]["max_wind_speed"] = max_wind
+        docs.append(doc)
+    jobs = [
+        {"_id": f"job{i}", **{k: d[k] for k in ("device_id", "date", "start_time", "end_time")}}
+        for i, d in enumerate(docs)
+    ]
+    jobs.append({**jobs[0], "_id": "gone", "device_id": "deleted"})
+
+    class Thresholds:
+        def find(self, query):
+            assert len(query["$or"]) == 4
+            return _Cursor([dict(d) for d in docs])
+
+    forecast = AsyncMock(return_value=[{"wind_speed": 10, "temp": 15}])
+    send = AsyncMock(return_value={})
+    monkeypatch.setattr(alert_service, "thresholds_collection", Thresholds())
+    monkeypatch.setattr(alert_service, "get_next_hours_forecast", forecast)
+    monkeypatch.setattr(alert_service, "send_notifications", send)
+
+    failures = asyncio.run(alert_service._run_pre_route_alerts(jobs))
+
+    assert failures == {}
+    assert forecast.await_count == 2
+    sent = dict(send.await_args.args[0].values())
+    assert sent["device0"].startswith("Wind is high")
+    assert sent["device1"] == alert_service.FINE_MESSAGE
+    assert sent["device2"].startswith("Wind is high")
+    assert "deleted" not in sent
+
+
+def test_pre_route_alert_failures_are_per_cell(monkeypatch):
+    today = date.today().isoformat()
+    docs = []
+    for i, lat in enumerate([51.45, 40.0]):
+        doc = _threshold_doc(today)
+        doc["device_id"] = f"device{i}"
+        doc["office_location"] = {"latitude": lat, "longitude": -2.6}
+        docs.append(doc)
+    jobs = [
+        {"_id": f"job{i}", **{k: d[k] for k in ("device_id", "date", "start_time", "end_time")}}
+        for i, d in enumerate(docs)
+    ]
+
+    class Thresholds:
+        def find(self, query):
+            return _Cursor([dict(d) for d in docs])
+
+    async def forecast(lat, lon, hours, priority=None):
+        if lat < 45:
+            raise RuntimeError("upstream down")
+        return [{"wind_speed": 1, "temp": 15}]
+
+    send = AsyncMock(return_value={})
+    monkeypatch.setattr(alert_service, "thresholds_collection", Thresholds())
+    monkeypatch.setattr(alert_service, "get_next_hours_forecast", forecast)
+    monkeypatch.setattr(alert_service, "send_notifications", send)
+
+    failures = asyncio.run(alert_service._run_pre_route_alerts(jobs))
+
+    assert list(failures) == ["job1"]
+    assert send.await_args.args[0] == {"job0": ("device0", alert_service.FINE_MESSAGE)}
+
+
+def test_pre_route_alert_jobs_fail_when_their_send_fails(monkeypatch):
+    doc = _threshold_doc(date.today().isoformat())
+    jobs = [{"_id": "job0", **{k: doc[k] for k in ("device_id", "date", "start_time", "end_time")}}]
+
+    class Thresholds:
+        def find(self, query):
+            return _Cursor([dict(doc)])
+
+    error = RuntimeError("FCM unavailable")
+    monkeypatch.setattr(alert_service, "thresholds_collection", Thresholds())
+    monkeypatch.setattr(
+        alert_service,
+        "get_next_hours_forecast",
+        AsyncMock(return_value=[{"wind_speed": 1, "temp": 15}]),
+    )
+    monkeypatch.setattr(
+        alert_service, "send_notifications", AsyncMock(return_value={"job0": error})
+    )
+
+    assert asyncio.run(alert_service._run_pre_route_alerts(jobs)) == {"job0": error}
+
+
+def test_rescheduling_replaces_the_thresholds_job(monkeypatch):
+    from models.thresholds import Thresholds
+
+    threshold = Thresholds(**_threshold_doc((date.today() + timedelta(days=1)).isoformat()))
+    scheduler = AsyncMock()
+    monkeypatch.setattr(alert_service, "job_scheduler", scheduler)
+
+    asyncio.run(alert_service.schedule_pre_route_alert(threshold, "abc123"))
+
+    kind, job_id, _ = scheduler.schedule.await_args.args
+    assert (kind, job_id) == ("pre_route_alert", "pre_route_alert:abc123")
+    assert scheduler.schedule.await_args.kwargs["threshold_id"] == "abc123"
+    query = scheduler.cancel.await_args.args[0]
+    assert query["_id"] == {"$ne": "pre_route_alert:abc123"}
+    assert query["kind"] == "pre_route_alert"
+    assert (query["device_id"], query["start_time"]) == ("device1", "08:00")
@@ -46,3 +46,57 @@ def test_evaluate_thresholds_no_flags():
     )
     msgs = evaluate_thresholds(weather, limits)
     assert msgs == []
+
+
+def test_batch_evaluator_matches_scalar():
+    import random
+
+    import pytest
+
+    from services.commute_evaluator import (
+        evaluate_detailed_thresholds,
+        evaluate_detailed_thresholds_batch,
+    )
+
+    rng = random.Random(42)
+    limits = WeatherLimits(
+        max_wind_speed=8,
+        max_rain_intensity=2,
+        max_humidity=85,
+        min_temperature=4,
+        max_temperature=26,
+        headwind_sensitivity=5,
+        crosswind_sensitivity=4,
+        min_visibility=3000,
+        max_uv_index=6,
+        max_pollution=80,
+    )
+
+    def maybe(value):
+        return None if rng.random() < 0.1 else value
+
+    fields = ("wind_speed", "wind_deg", "rain", "humidity", "temp", "visibility", "uvi", "pollution")
+    weathers = [
+        {
+            "wind_speed": maybe(rng.uniform(0, 12)),
+            "wind_deg": maybe(rng.uniform(0, 360)),
+            "rain": maybe(rng.uniform(0, 3)),
+            "humidity": maybe(rng.uniform(40, 100)),
+            "temp": maybe(rng.uniform(-2, 32)),
+            "visibility": maybe(rng.choice([1000, 5000, 10000])),
+            "uvi": maybe(rng.uniform(0, 9)),
+            "pollution": maybe(rng.uniform(0, 120)),
+        }
+        for _ in range(500)
+    ]
+    bearings = [maybe(rng.uniform(0, 360)) for _ in weathers]
+    columns = {f: [w[f] for w in weathers] for f in fields}
+
+    batch = evaluate_detailed_thresholds_batch(columns, limits, bearings)
+
+    for weather, bearing, result in zip(weathers, bearings, batch):
+        expected = evaluate_detailed_thresholds(weather, limits, bearing)
+        assert result["issues"] == expected["issues"]
+        assert result["borderline"] == expected["borderline"]
+        assert result["headwind"] == pytest.approx(expected["headwind"])
+        assert result["crosswind"] == pytest.approx(expected["crosswind"])
@@ -0,0 +1,40 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+from services import forecast_cache_service
+
+
+def test_save_forecast_run_upserts_one_doc_per_cell_and_run(monkeypatch):
+    collection = type("C", (), {"update_one": AsyncMock()})()
+    monkeypatch.setattr(forecast_cache_service, "forecasts_collection", collection)
+    run = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+    expires = run + timedelta(hours=3)
+
+    asyncio.run(
+        forecast_cache_service.save_forecast_run(
+            (100, 200), 1.0, 2.0, run, 8, [{"dt": 1}], expires
+        )
+    )
+
+    filter_doc, update_doc = collection.update_one.call_args.args
+    assert filter_doc == {"cell": "100:200", "run": run}
+    assert update_doc["$set"]["expires_at"] == expires
+    assert update_doc["$set"]["forecasts"] == [{"dt": 1}]
+    assert collection.update_one.call_args.kwargs["upsert"] is True
+
+
+def test_load_forecast_run(monkeypatch):
+    collection = type(
+        "C",
+        (),
+        {"find_one": AsyncMock(return_value={"forecasts": [{"dt": 1}], "fetched_at": None})},
+    )()
+    monkeypatch.setattr(forecast_cache_service, "forecasts_collection", collection)
+    run = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+
+    result = asyncio.run(forecast_cache_service.load_forecast_run((1, 2), run, 8))
+
+    assert result["forecasts"] == [{"dt": 1}]
+    query = collection.find_one.call_args.args[0]
+    assert query == {"cell": "1:2", "run": run, "slots": {"$gte": 8}}
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from services.forecast_series import ForecastSeries, SLOT_SECONDS
+
+
+def _series():
+    return ForecastSeries.from_records(
+        [
+            {"dt": 0, "temp": 10, "rain": 1.0, "humidity": None},
+            {"dt": SLOT_SECONDS, "temp": 16, "humidity": 50},
+            {"dt": 2 * SLOT_SECONDS, "temp": 13, "rain": 3.0, "humidity": 70},
+        ]
+    )
+
+
+def test_interpolate_is_vectorized_over_target_times():
+    series = _series()
+    ts = np.array([0, SLOT_SECONDS / 2, SLOT_SECONDS, 10 * SLOT_SECONDS])
+    cols = series.interpolate(ts)
+    assert cols["temp"].tolist() == pytest.approx([10, 13, 16, 13])
+    # dry slots count as zero rain; missing humidity is skipped, not zeroed
+    assert cols["rain"].tolist() == pytest.approx([1.0, 0.5, 0.0, 3.0])
+    assert cols["humidity"].tolist() == pytest.approx([50, 50, 50, 70])
+    assert np.isnan(cols["uvi"]).all()
+
+
+def test_records_round_trip():
+    series = _series()
+    again = ForecastSeries.from_records(series.to_records())
+    assert again.times.tolist() == series.times.tolist()
+    assert again.to_records() == series.to_records()
+    assert again.to_records()[0]["uvi"] is None
+
+
+def test_upcoming_starts_at_slot_covering_now():
+    series = _series()
+    slots = series.upcoming(SLOT_SECONDS + 60, 6)
+    assert [s["dt"] for s in slots] == [SLOT_SECONDS, 2 * SLOT_SECONDS]
@@ -0,0 +1,426 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from services.job_scheduler import JobScheduler
+
+
+def _utc(value):
+    # Mongo returns naive UTC datetimes.
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+            continue
+        value = _utc(doc.get(key))
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == "$ne" and value == arg:
+                    return False
+                if op == "$nin" and value in arg:
+                    return False
+                if op == "$lte" and (value is None or value > arg):
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _apply(doc, update):
+    doc.update(update.get("$set", {}))
+    for key, n in update.get("$inc", {}).items():
+        doc[key] = doc.get(key, 0) + n
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs.sort(key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeJobs:
+    def __init__(self):
+        self.docs = {}
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs.values():
+            if _matches(doc, query):
+                _apply(doc, update)
+                return SimpleNamespace(matched_count=1)
+        if upsert:
+            doc = {"_id": query["_id"], **update.get("$setOnInsert", {})}
+            _apply(doc, update)
+            self.docs[doc["_id"]] = doc
+        return SimpleNamespace(matched_count=0)
+
+    async def bulk_write(self, ops, ordered):
+        added = 0
+        for op in ops:
+            before = len(self.docs)
+            await self.update_one(op._filter, op._doc, upsert=op._upsert)
+            added += len(self.docs) - before
+        return SimpleNamespace(upserted_count=added)
+
+    async def update_many(self, query, update):
+        matched = [d for d in self.docs.values() if _matches(d, query)]
+        for doc in matched:
+            _apply(doc, update)
+        return SimpleNamespace(modified_count=len(matched))
+
+    async def aggregate(self, pipeline):
+        # Only the $match stage varies; the grouping is always by device and kind.
+        match = pipeline[0]["$match"]
+        counts = {}
+        for doc in self.docs.values():
+            if _matches(doc, match):
+                key = (doc.get("device_id"), doc["kind"])
+                counts[key] = counts.get(key, 0) + 1
+        for (device_id, kind), count in counts.items():
+            yield {"_id": {"device_id": device_id, "kind": kind}, "count": count}
+
+    def find(self, query, projection=None):
+        return _Cursor([dict(d) for d in self.docs.values() if _matches(d, query)])
+
+    async def find_one_and_update(self, query, update, sort=None, return_document=None):
+        # Yield like a round trip would, so concurrent claimers interleave.
+        await asyncio.sleep(0)
+        docs = list(self.docs.values())
+        if sort:
+            key, direction = sort[0]
+            docs.sort(key=lambda d: _utc(d[key]), reverse=direction < 0)
+        for doc in docs:
+            if _matches(doc, query):
+                _apply(doc, update)
+                return dict(doc)
+        return None
+
+
+def _scheduler(jobs, clock, **kwargs):
+    opts = dict(
+        poll_interval_s=0.05,
+        max_lateness_s=600,
+        claim_batch=100,
+        concurrency=4,
+        worker_id="w1",
+        lease_s=60,
+    )
+    opts.update(kwargs)
+    return JobScheduler(jobs, clock=clock, **opts)
+
+
+def _at(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def test_due_jobs_fire_once_and_far_jobs_wait():
+    async def run():
+        jobs = FakeJobs()
+        fired = []
+
+        async def handler(job):
+            fired.append(job["_id"])
+
+        now = datetime.now(timezone.utc).timestamp()
+        sched = _scheduler(jobs, lambda: now)
+        sched.register("ping", handler)
+        await sched.start()
+        await sched.schedule("ping", "soon", _at(now - 1), device_id="d1")
+        await sched.schedule("ping", "later", _at(now + 3600))
+        await asyncio.sleep(0.2)
+        await sched.stop()
+        return jobs, fired, sched
+
+    jobs, fired, sched = asyncio.run(run())
+    assert fired == ["soon"]
+    assert jobs.docs["soon"]["status"] == "done"
+    assert jobs.docs["soon"]["device_id"] == "d1"
+    assert jobs.docs["later"]["status"] == "pending"
+    assert sched.stats()["fired"] == 1
+
+
+def test_rescheduling_same_time_does_not_rerun_finished_job():
+    async def run():
+        jobs = FakeJobs()
+        calls = []
+
+        async def handler(job):
+            calls.append(job["_id"])
+
+        now = datetime.now(timezone.utc).timestamp()
+        sched = _scheduler(jobs, lambda: now)
+        sched.register("ping", handler)
+        await sched.start()
+        await sched.schedule("ping", "job", _at(now - 1))
+        await asyncio.sleep(0.1)
+        await sched.schedule("ping", "job", _at(now - 1))
+        await asyncio.sleep(0.1)
+        moved = _at(now + 30)
+        await sched.schedule("ping", "job", moved)
+        await sched.stop()
+        return jobs, calls, moved
+
+    jobs, calls, moved = asyncio.run(run())
+    assert calls == ["job"]
+    assert jobs.docs["job"]["status"] == "pending"
+    assert jobs.docs["job"]["fire_at"] == moved
+
+
+def test_jobs_too_late_expire_and_failures_are_recorded():
+    async def run():
+        jobs = FakeJobs()
+        now = datetime.now(timezone.utc).timestamp()
+        sched = _scheduler(jobs, lambda: now, max_lateness_s=60)
+
+        async def boom(job):
+            raise RuntimeError("boom")
+
+        sched.register("ping", boom)
+        await sched.schedule("ping", "stale", _at(now - 7200))
+        await sched.schedule("ping", "broken", _at(now - 1))
+        # Pretend the stale job was scheduled well before its fire time.
+        jobs.docs["stale"]["scheduled_at"] = _at(now - 10000)
+        await sched.start()
+        await asyncio.sleep(0.2)
+        await sched.stop()
+        return jobs
+
+    jobs = asyncio.run(run())
+    assert jobs.docs["stale"]["status"] == "expired"
+    assert jobs.docs["broken"]["status"] == "failed"
+    assert jobs.docs["broken"]["error"] == "boom"
+
+
+def test_jobs_of_a_dead_worker_are_reclaimed_after_their_lease():
+    async def run():
+        jobs = FakeJobs()
+        now = datetime.now(timezone.utc).timestamp()
+        base = {
+            "kind": "ping",
+            "status": "running",
+            "owner": "dead",
+            "fire_at": _at(now - 5).replace(tzinfo=None),
+            "scheduled_at": _at(now - 100).replace(tzinfo=None),
+            "attempts": 1,
+        }
+        jobs.docs["job"] = {
+            **base,
+            "_id": "job",
+            "lease_expires_at": _at(now - 1).replace(tzinfo=None),
+        }
+        jobs.docs["leased"] = {
+            **base,
+            "_id": "leased",
+            "lease_expires_at": _at(now + 30).replace(tzinfo=None),
+        }
+        fired = []
+
+        async def handler(job):
+            fired.append(job["attempts"])
+
+        sched = _scheduler(jobs, lambda: now)
+        sched.register("ping", handler)
+        await sched.start()
+        await asyncio.sleep(0.2)
+        await sched.stop()
+        return jobs, fired
+
+    jobs, fired = asyncio.run(run())
+    assert fired == [2]
+    assert jobs.docs["job"]["status"] == "done"
+    assert jobs.docs["job"]["owner"] == "w1"
+    assert jobs.docs["leased"]["status"] == "running"
+    assert jobs.docs["leased"]["owner"] == "dead"
+
+
+def test_each_job_runs_once_across_workers():
+    async def run():
+        jobs = FakeJobs()
+        runs = []
+
+        async def handler(due):
+            for job in due:
+                runs.append((job["_id"], job["owner"]))
+                await asyncio.sleep(0)
+
+        now = datetime.now(timezone.utc).timestamp()
+        workers = [
+            _scheduler(jobs, lambda: now, worker_id=f"w{i}") for i in range(3)
+        ]
+        for sched in workers:
+            sched.register("alert", handler, batch=True)
+            # Every worker back-fills the same jobs at startup.
+            for n in range(30):
+                await sched.schedule("alert", f"job{n}", _at(now - 1))
+        for sched in workers:
+            await sched.start()
+        await asyncio.sleep(0.2)
+        for sched in workers:
+            await sched.stop()
+        return jobs, runs
+
+    jobs, runs = asyncio.run(run())
+    assert sorted(job_id for job_id, _ in runs) == sorted(f"job{n}" for n in range(30))
+    assert all(jobs.docs[job_id]["status"] == "done" for job_id, _ in runs)
+    assert all(jobs.docs[job_id]["owner"] == owner for job_id, owner in runs)
+
+
+def test_worker_that_lost_its_lease_does_not_finish_the_job():
+    async def run():
+        jobs = FakeJobs()
+        now = datetime.now(timezone.utc).timestamp()
+        sched = _scheduler(jobs, lambda: now)
+
+        async def handler(job):
+            # Another worker took over after the lease ran out.
+            jobs.docs[job["_id"]]["owner"] = "w2"
+
+        sched.register("ping", handler)
+        await sched.schedule("ping", "job", _at(now - 1))
+        await sched.start()
+        await asyncio.sleep(0.2)
+        await sched.stop()
+        return jobs, sched
+
+    jobs, sched = asyncio.run(run())
+    assert jobs.docs["job"]["status"] == "running"
+    assert sched.stats()["lease_lost"] == 1
+
+
+def test_batch_kind_gets_all_jobs_due_in_a_tick():
+    async def run():
+        jobs = FakeJobs()
+        batches = []
+
+        async def handler(due):
+            batches.append(sorted(job["_id"] for job in due))
+            return {"b": RuntimeError("no forecast")}
+
+        now = datetime.now(timezone.utc).timestamp()
+        sched = _scheduler(jobs, lambda: now)
+        sched.register("alert", handler, batch=True)
+        for job_id in ("a", "b", "c"):
+            await sched.schedule("alert", job_id, _at(now - 1))
+        await sched.start()
+        await asyncio.sleep(0.2)
+        await sched.stop()
+        return jobs, batches, sched
+
+    jobs, batches, sched = asyncio.run(run())
+    assert batches == [["a", "b", "c"]]
+    assert [jobs.docs[j]["status"] for j in "abc"] == ["done", "failed", "done"]
+    assert sched.stats()["batches"] == 1
+
+
+def test_cancel_and_pending_counts():
+    async def run():
+        jobs = FakeJobs()
+        now = datetime.now(timezone.utc).timestamp()
+        sched = _scheduler(jobs, lambda: now)
+        for n in range(3):
+            await sched.schedule("alert", f"a{n}", _at(now + 3600), device_id="d1")
+        await sched.schedule("reminder", "r0", _at(now + 3600), device_id="d1")
+        await sched.schedule("alert", "b0", _at(now + 3600), device_id="d2")
+        cancelled = await sched.cancel({"device_id": "d1", "_id": {"$ne": "a0"}, "kind": "alert"})
+        return jobs, sched, cancelled, await sched.pending_counts(), await sched.pending_counts("d2")
+
+    jobs, sched, cancelled, counts, d2 = asyncio.run(run())
+    assert cancelled == 2
+    assert jobs.docs["a1"]["status"] == "cancelled"
+    assert counts == {"d1": {"alert": 1, "reminder": 1}, "d2": {"alert": 1}}
+    assert d2 == {"d2": {"alert": 1}}
+    assert sched.stats()["cancelled"] == 2
+
+
+def test_a_wave_larger_than_the_claim_batch_is_not_held_to_the_poll():
+    async def run():
+        jobs = FakeJobs()
+        fired = []
+
+        async def handler(due):
+            fired.extend(job["_id"] for job in due)
+
+        now = datetime.now(timezone.utc).timestamp()
+        # Scheduled by another process, so nothing wakes this one up.
+        other = _scheduler(jobs, lambda: now)
+        for n in range(55):
+            await other.schedule("alert", f"job{n}", _at(now - 1))
+        sched = _scheduler(jobs, lambda: now, claim_batch=10, poll_interval_s=60)
+        sched.register("alert", handler, batch=True)
+        await sched.start()
+        await asyncio.sleep(0.3)
+        await sched.stop()
+        return jobs, fired
+
+    jobs, fired = asyncio.run(run())
+    assert len(fired) == len(set(fired)) == 55
+    assert all(doc["status"] == "done" for doc in jobs.docs.values())
+
+
+def test_workers_split_a_wave_between_them():
+    async def run():
+        jobs = FakeJobs()
+        owners = {}
+
+        async def handler(due):
+            for job in due:
+                owners[job["_id"]] = job["owner"]
+            await asyncio.sleep(0.01)
+
+        now = datetime.now(timezone.utc).timestamp()
+        other = _scheduler(jobs, lambda: now)
+        for n in range(200):
+            await other.schedule("alert", f"job{n}", _at(now - 1))
+        workers = [
+            _scheduler(jobs, lambda: now, worker_id=f"w{i}", claim_batch=20)
+            for i in range(2)
+        ]
+        for sched in workers:
+            sched.register("alert", handler, batch=True)
+            await sched.start()
+        await asyncio.sleep(0.5)
+        for sched in workers:
+            await sched.stop()
+        return jobs, owners
+
+    jobs, owners = asyncio.run(run())
+    assert len(owners) == 200
+    assert all(doc["status"] == "done" for doc in jobs.docs.values())
+    per_worker = [list(owners.values()).count(f"w{i}") for i in range(2)]
+    assert min(per_worker) >= 50
+
+
+def test_schedule_missing_only_adds_new_jobs():
+    async def run():
+        jobs = FakeJobs()
+        now = datetime.now(timezone.utc).timestamp()
+        sched = _scheduler(jobs, lambda: now)
+        await sched.schedule("alert", "old", _at(now + 60), device_id="d1")
+        added = await sched.schedule_missing(
+            [
+                ("alert", "old", _at(now + 3600), {"device_id": "d1"}),
+                ("alert", "new", _at(now + 3600), {"device_id": "d2"}),
+            ]
+        )
+        return jobs, added, now
+
+    jobs, added, now = asyncio.run(run())
+    assert added == 1
+    assert jobs.docs["old"]["fire_at"] == _at(now + 60)
+    assert jobs.docs["new"]["device_id"] == "d2"
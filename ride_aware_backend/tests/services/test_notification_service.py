@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from services import notification_service
+from services.notification_service import MemorySender
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+
+class Tokens:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.queries = []
+
+    def find(self, query, projection=None):
+        ids = query["device_id"]["$in"]
+        self.queries.append(sorted(ids))
+        return _Cursor(
+            [{"device_id": d, "fcm_token": self.tokens[d]} for d in ids if d in self.tokens]
+        )
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    coll = Tokens({"a": "tok-a", "b": "tok-b"})
+    monkeypatch.setattr(notification_service, "fcm_tokens_collection", coll)
+    notification_service._token_cache.clear()
+    yield coll
+    notification_service._token_cache.clear()
+
+
+def test_token_lookups_are_batched_and_cached(tokens):
+    first = asyncio.run(notification_service.lookup_tokens(["a", "b", "c", "a"]))
+    second = asyncio.run(notification_service.lookup_tokens(["a", "b"]))
+
+    assert first == {"a": "tok-a", "b": "tok-b", "c": None}
+    assert second == {"a": "tok-a", "b": "tok-b"}
+    assert tokens.queries == [["a", "b", "c"]]
+
+
+def test_missing_tokens_are_not_cached(tokens):
+    asyncio.run(notification_service.lookup_tokens(["c"]))
+    # Registered through another worker, so nothing invalidated the cache here.
+    tokens.tokens["c"] = "tok-c"
+
+    assert asyncio.run(notification_service.lookup_tokens(["c"])) == {"c": "tok-c"}
+    assert tokens.queries == [["c"], ["c"]]
+
+
+def test_registering_a_token_invalidates_the_cache(tokens):
+    asyncio.run(notification_service.lookup_tokens(["a"]))
+    tokens.tokens["a"] = "tok-a2"
+    notification_service.invalidate_token("a")
+
+    assert asyncio.run(notification_service.lookup_tokens(["a"])) == {"a": "tok-a2"}
+    assert tokens.queries == [["a"], ["a"]]
+
+
+class StaleTokenSender(MemorySender):
+    async def send_batch(self, notifications):
+        if any(n.token == "tok-b" for n in notifications):
+            raise RuntimeError("token no longer registered")
+        await super().send_batch(notifications)
+
+
+def test_a_failed_batch_is_retried_with_fresh_tokens(tokens):
+    asyncio.run(notification_service.lookup_tokens(["b"]))
+    # The device re-registered with another worker.
+    tokens.tokens["b"] = "tok-b2"
+    sender = StaleTokenSender()
+    notification_service.set_notification_sender(sender)
+    try:
+        failures = asyncio.run(
+            notification_service.send_notifications({"j1": ("b", "all fine")})
+        )
+    finally:
+        notification_service.set_notification_sender(None)
+
+    assert failures == {}
+    assert [n.token for n in sender.sent] == ["tok-b2"]
+
+
+class FailingSender(MemorySender):
+    async def send_batch(self, notifications):
+        if any(n.device_id == "b" for n in notifications):
+            raise RuntimeError("FCM unavailable")
+        await super().send_batch(notifications)
+
+
+def test_send_batches_and_skips_missing_tokens(tokens):
+    sender = MemorySender()
+    notification_service.set_notification_sender(sender)
+    try:
+        failures = asyncio.run(
+            notification_service.send_notifications(
+                {
+                    "j1": ("a", "rain later"),
+                    "j2": ("c", "nobody home"),
+                    "j3": ("b", "all fine"),
+                }
+            )
+        )
+    finally:
+        notification_service.set_notification_sender(None)
+
+    assert failures == {}
+    assert len(sender.batches) == 1
+    assert [(n.device_id, n.token, n.message) for n in sender.sent] == [
+        ("a", "tok-a", "rain later"),
+        ("b", "tok-b", "all fine"),
+    ]
+    assert len(tokens.queries) == 1
+
+
+def test_a_failed_batch_is_reported_for_its_messages_only(tokens, monkeypatch):
+    monkeypatch.setattr(notification_service, "NOTIFICATION_BATCH_SIZE", 1)
+    sender = FailingSender()
+    notification_service.set_notification_sender(sender)
+    try:
+        failures = asyncio.run(
+            notification_service.send_notifications(
+                {"j1": ("a", "rain later"), "j2": ("b", "all fine")}
+            )
+        )
+    finally:
+        notification_service.set_notification_sender(None)
+
+    assert list(failures) == ["j2"]
+    assert [n.device_id for n in sender.sent] == ["a"]
+
+
+def test_senders_must_implement_send_batch():
+    with pytest.raises(TypeError):
+        notification_service.NotificationSender()
@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+import pytest
+
+from services import route_geometry
+
+
+def _pt(lat, lon):
+    return {"latitude": lat, "longitude": lon}
+
+
+def _scalar_bearing(a, b):
+    lat1 = math.radians(a["latitude"])
+    lat2 = math.radians(b["latitude"])
+    dlon = math.radians(b["longitude"] - a["longitude"])
+    y = math.sin(dlon) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
+    return (math.degrees(math.atan2(y, x)) + 360) % 360
+
+
+def test_segment_bearings_and_distances_match_scalar_formulas():
+    rng = np.random.default_rng(3)
+    points = [
+        _pt(float(lat), float(lon))
+        for lat, lon in zip(51 + rng.uniform(-0.05, 0.05, 30), rng.uniform(-0.2, 0.2, 30))
+    ]
+    geometry = route_geometry.compute_route_geometry(points)
+
+    expected = [_scalar_bearing(a, b) for a, b in zip(points, points[1:])]
+    assert geometry.segment_bearings == pytest.approx(expected)
+    assert geometry.cumulative_m[0] == 0
+    assert geometry.total_m == pytest.approx(geometry.segment_lengths_m.sum())
+
+
+def test_local_bearing_follows_a_corner():
+    # North for ~1.1 km, then east.
+    points = [_pt(51.0, 0.0), _pt(51.01, 0.0), _pt(51.01, 0.016)]
+    geometry = route_geometry.compute_route_geometry(points)
+
+    assert geometry.point_bearings[0] == pytest.approx(0, abs=0.01)
+    assert geometry.point_bearings[1] == pytest.approx(45, abs=0.1)
+    assert geometry.point_bearings[2] == pytest.approx(90, abs=0.1)
+    assert geometry.total_m == pytest.approx(2232, rel=0.01)
+
+
+def test_repeated_points_and_single_point_routes():
+    geometry = route_geometry.compute_route_geometry([_pt(51, 0), _pt(51, 0), _pt(51.01, 0)])
+    assert np.isnan(geometry.segment_bearings[0])
+    assert geometry.point_bearings.tolist()[1:] == pytest.approx([0, 0], abs=0.01)
+    assert np.isnan(geometry.point_bearings[0])
+
+    single = route_geometry.compute_route_geometry([_pt(51, 0)])
+    assert single.total_m == 0
+    assert route_geometry.bearings_as_list(single.point_bearings) == [None]
+
+
+def test_samples_match_the_segment_walk():
+    from models.wind import Coordinate
+    from services.wind_service import sample_route_points
+
+    rng = np.random.default_rng(11)
+    lats = 51 + np.cumsum(rng.uniform(-0.004, 0.006, 60))
+    lons = np.cumsum(rng.uniform(-0.004, 0.006, 60))
+    points = [_pt(float(a), float(b)) for a, b in zip(lats, lons)]
+
+    lat, lon, dist = route_geometry.sample_along(route_geometry.compute_route_geometry(points))
+    expected = sample_route_points([Coordinate(lat=a, lon=b) for a, b in zip(lats, lons)])
+
+    assert len(lat) == len(expected)
+    assert lat == pytest.approx([c.lat for c in expected])
+    assert lon == pytest.approx([c.lon for c in expected])
+    assert dist.tolist() == [1000.0 * (i + 1) for i in range(len(expected))]
+
+
+def _max_offset_m(points, kept):
+    """Largest distance of any original point from the simplified polyline."""
+    lat0 = np.radians(np.mean([p["latitude"] for p in points]))
+    xy = np.array(
+        [
+            [np.radians(p["longitude"]) * np.cos(lat0), np.radians(p["latitude"])]
+            for p in points
+        ]
+    ) * route_geometry.EARTH_RADIUS_M
+    worst = 0.0
+    for a, b in zip(kept, kept[1:]):
+        seg = xy[b] - xy[a]
+        for p in xy[a + 1 : b]:
+            rel = p - xy[a]
+            worst = max(worst, abs(rel[0] * seg[1] - rel[1] * seg[0]) / np.hypot(*seg))
+    return worst
+
+
+def test_simplify_keeps_corners_and_respects_the_tolerance():
+    rng = np.random.default_rng(5)
+    # 1 Hz GPS trace: 1 km north then 1 km east, with ~2 m of jitter.
+    north = [_pt(51 + i * 4.5e-5, 0.0) for i in range(200)]
+    east = [_pt(51 + 199 * 4.5e-5, i * 7.1e-5) for i in range(1, 200)]
+    points = [
+        _pt(p["latitude"] + rng.normal(0, 1.5e-5), p["longitude"] + rng.normal(0, 2e-5))
+        for p in north + east
+    ]
+
+    lat = np.array([p["latitude"] for p in points])
+    lon = np.array([p["longitude"] for p in points])
+    kept = route_geometry.simplify_indices(lat, lon, 10).tolist()
+
+    assert kept[0] == 0 and kept[-1] == len(points) - 1
+    assert len(kept) < 20
+    assert any(abs(i - 199) <= 3 for i in kept)
+    assert _max_offset_m(points, kept) <= 10
+    assert route_geometry.simplify_points(points, 10) == [points[i] for i in kept]
+
+
+def test_simplify_leaves_short_routes_alone():
+    points = [_pt(51, 0), _pt(51.001, 0)]
+    assert route_geometry.simplify_points(points, 10) == points
+    assert route_geometry.simplify_indices(np.array([51.0]), np.array([0.0]), 0).tolist() == [0]
+
+
+def test_simplify_matches_recursive_douglas_peucker():
+    rng = np.random.default_rng(8)
+    lat = 51 + np.cumsum(rng.normal(0, 5e-5, 500))
+    lon = np.cumsum(rng.normal(0, 5e-5, 500))
+    y = np.radians(lat) * route_geometry.EARTH_RADIUS_M
+    x = np.radians(lon) * route_geometry.EARTH_RADIUS_M * np.cos(np.radians(lat.mean()))
+
+    def reference(first, last, out):
+        if last - first < 2:
+            return
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        dists = [
+            abs((x[i] - x[first]) * dy - (y[i] - y[first]) * dx) / math.hypot(dx, dy)
+            for i in range(first + 1, last)
+        ]
+        worst = max(range(len(dists)), key=dists.__getitem__)
+        if dists[worst] > 4:
+            split = first + 1 + worst
+            out.add(split)
+            reference(first, split, out)
+            reference(split, last, out)
+
+    expected = {0, len(lat) - 1}
+    reference(0, len(lat) - 1, expected)
+
+    assert route_geometry.simplify_indices(lat, lon, 4).tolist() == sorted(expected)
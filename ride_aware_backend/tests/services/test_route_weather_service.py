@@ -0,0 +1,244 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+from models.thresholds import WeatherLimits
+from services import route_weather_service
+from services.upstream_scheduler import UpstreamShedError
+from services.weather_service import ForecastUnavailableError
+
+
+def _limits() -> WeatherLimits:
+    return WeatherLimits(
+        max_wind_speed=10,
+        max_rain_intensity=5,
+        max_humidity=80,
+        min_temperature=0,
+        max_temperature=30,
+    )
+
+
+def _points(n):
+    return [{"latitude": 51.0 + i * 0.1, "longitude": -0.1} for i in range(n)]
+
+
+def test_points_are_fetched_concurrently_with_a_limit(monkeypatch):
+    in_flight = 0
+    peak = 0
+
+    async def fake_forecast(lat, lon, when, priority=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return {"wind_speed": 3, "temp": 12, "humidity": 50}
+
+    monkeypatch.setattr(route_weather_service, "get_hourly_forecast", fake_forecast)
+
+    started = time.perf_counter()
+    result = asyncio.run(
+        route_weather_service.evaluate_route_weather(
+            _points(20), datetime(2024, 1, 1, 8), _limits(), concurrency=10
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    assert peak == 10
+    assert elapsed < 0.5
+    assert [p["index"] for p in result["points"]] == list(range(20))
+    assert result["unknown_points"] == []
+    assert result["status"] == "ok"
+
+
+def test_points_past_the_deadline_are_unknown(monkeypatch):
+    async def fake_forecast(lat, lon, when, priority=None):
+        if lat > 51.25:
+            await asyncio.sleep(1)
+        return {"wind_speed": 3, "temp": 12, "humidity": 50}
+
+    monkeypatch.setattr(route_weather_service, "get_hourly_forecast", fake_forecast)
+
+    result = asyncio.run(
+        route_weather_service.evaluate_route_weather(
+            _points(5), datetime(2024, 1, 1, 8), _limits(), deadline_s=0.1
+        )
+    )
+    assert result["unknown_points"] == [3, 4]
+    assert result["points"][3]["weather"] is None
+    assert result["points"][0]["weather"]["temp"] == 12
+    assert result["status"] == "partial"
+
+
+def test_deadline_before_any_cell_answers_is_unavailable(monkeypatch):
+    async def fake_forecast(lat, lon, when, priority=None):
+        await asyncio.sleep(1)
+        return {"wind_speed": 3, "temp": 12}
+
+    monkeypatch.setattr(route_weather_service, "get_hourly_forecast", fake_forecast)
+
+    with pytest.raises(ForecastUnavailableError):
+        asyncio.run(
+            route_weather_service.evaluate_route_weather(
+                _points(3), datetime(2024, 1, 1, 8), _limits(), deadline_s=0.05
+            )
+        )
+
+
+def test_temperature_extremes_are_none_when_never_reported(monkeypatch):
+    async def fake_forecast(lat, lon, when, priority=None):
+        return {"wind_speed": 3, "humidity": 50}
+
+    monkeypatch.setattr(route_weather_service, "get_hourly_forecast", fake_forecast)
+
+    result = asyncio.run(
+        route_weather_service.evaluate_route_weather(
+            _points(2), datetime(2024, 1, 1, 8), _limits()
+        )
+    )
+    assert result["summary"]["min_temp"] is None
+    assert result["summary"]["max_temp"] is None
+
+
+def test_all_points_failing_raises(monkeypatch):
+    async def fake_forecast(lat, lon, when, priority=None):
+        raise UpstreamShedError("shed")
+
+    monkeypatch.setattr(route_weather_service, "get_hourly_forecast", fake_forecast)
+
+    with pytest.raises(UpstreamShedError):
+        asyncio.run(
+            route_weather_service.evaluate_route_weather(
+                _points(3), datetime(2024, 1, 1, 8), _limits()
+            )
+        )
+
+
+def test_dense_points_are_fetched_once_per_grid_cell(monkeypatch):
+    calls = []
+
+    async def fake_forecast(lat, lon, when, priority=None):
+        calls.append((lat, lon))
+        return {"wind_speed": 3, "temp": 10 + len(calls), "humidity": 50}
+
+    monkeypatch.setattr(route_weather_service, "get_hourly_forecast", fake_forecast)
+    # 30 points a few metres apart in one cell, then 10 in a second cell
+    points = [{"latitude": 51.5 + i * 1e-5, "longitude": -0.1} for i in range(30)]
+    points += [{"latitude": 51.6 + i * 1e-5, "longitude": -0.1} for i in range(10)]
+
+    result = asyncio.run(
+        route_weather_service.evaluate_route_weather(
+            points, datetime(2024, 1, 1, 8), _limits()
+        )
+    )
+
+    assert len(calls) == 2
+    assert len(result["points"]) == 40
+    assert result["points"][0]["location"] == points[0]
+    temps = {p["weather"]["temp"] for p in result["points"]}
+    assert len(temps) == 2
+
+
+def test_wind_components_use_the_local_bearing(monkeypatch):
+    async def fake_forecast(lat, lon, when, priority=None):
+        # Wind from the north everywhere.
+        return {"wind_speed": 6, "wind_deg": 0, "temp": 12, "humidity": 50}
+
+    monkeypatch.setattr(route_weather_service, "get_hourly_forecast", fake_forecast)
+    # Ride north, then turn east.
+    points = [
+        {"latitude": 51.0, "longitude": 0.0},
+        {"latitude": 51.05, "longitude": 0.0},
+        {"latitude": 51.1, "longitude": 0.0},
+        {"latitude": 51.1, "longitude": 0.08},
+        {"latitude": 51.1, "longitude": 0.16},
+    ]
+
+    result = asyncio.run(
+        route_weather_service.evaluate_route_weather(points, datetime(2024, 1, 1, 8), _limits())
+    )
+
+    first, last = result["points"][0], result["points"][-1]
+    assert first["headwind"] == pytest.approx(6, abs=0.01)
+    assert first["crosswind"] == pytest.approx(0, abs=0.01)
+    assert last["headwind"] == pytest.approx(0, abs=0.01)
+    assert last["crosswind"] == pytest.approx(6, abs=0.01)
+    assert last["bearing"] == pytest.approx(90, abs=0.1)
+    assert result["summary"]["distance_m"] == pytest.approx(last["distance_m"])
+
+
+def test_time_aware_mode_evaluates_points_at_their_pass_time(monkeypatch):
+    from services.forecast_series import ForecastSeries
+
+    start = datetime(2024, 1, 1, 8)
+    t0 = int(start.timestamp())
+    # Dry at departure, heavy rain from an hour later.
+    series = ForecastSeries.from_records(
+        [
+            {"dt": t0, "rain": 0, "temp": 12, "humidity": 50, "wind_speed": 3},
+            {"dt": t0 + 3600, "rain": 10, "temp": 12, "humidity": 50, "wind_speed": 3},
+        ]
+    )
+    calls = []
+
+    async def fake_series(lat, lon, priority=None):
+        calls.append((lat, lon))
+        return series
+
+    monkeypatch.setattr(route_weather_service, "get_forecast_series", fake_series)
+    # ~20 km due north.
+    points = [{"latitude": 51.0 + i * 0.018, "longitude": -0.1} for i in range(11)]
+
+    result = asyncio.run(
+        route_weather_service.evaluate_route_weather(
+            points, start, _limits(), speed_kmh=20
+        )
+    )
+
+    first, last = result["points"][0], result["points"][-1]
+    # One series per grid cell, however many pass times fall in it.
+    assert len(calls) == len(set(calls)) == 11
+    assert first["weather"]["rain"] == pytest.approx(0)
+    assert first["pass_time"] == start.isoformat()
+    # ~22 km at 20 km/h is past the front.
+    assert last["weather"]["rain"] == pytest.approx(10)
+    assert result["summary"]["duration_s"] == pytest.approx(
+        result["summary"]["distance_m"] / (20 / 3.6)
+    )
+    assert result["status"] == "alert"
+
+
+def test_stream_yields_fast_cells_first_and_matches_batch(monkeypatch):
+    async def fake_forecast(lat, lon, when, priority=None):
+        # The first cell answers last.
+        await asyncio.sleep(0.05 if lat < 51.05 else 0)
+        return {"wind_speed": 3, "temp": 12, "humidity": 90 if lat > 51.25 else 50}
+
+    monkeypatch.setattr(route_weather_service, "get_hourly_forecast", fake_forecast)
+    when = datetime(2024, 1, 1, 8)
+
+    async def collect():
+        return [
+            r
+            async for r in route_weather_service.stream_route_weather(
+                _points(4), when, _limits()
+            )
+        ]
+
+    records = asyncio.run(collect())
+    batch = asyncio.run(
+        route_weather_service.evaluate_route_weather(_points(4), when, _limits())
+    )
+
+    assert [r["type"] for r in records] == ["point"] * 4 + ["summary"]
+    assert records[-2]["index"] == 0
+    by_index = {r.pop("index"): r for r in records[:-1]}
+    for point in batch["points"]:
+        streamed = by_index[point.pop("index")]
+        assert streamed.pop("type") == "point"
+        assert streamed == point
+    summary = records[-1]
+    assert summary["status"] == batch["status"] == "alert"
+    assert summary["summary"] == batch["summary"]
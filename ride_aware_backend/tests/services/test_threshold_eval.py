@@ -0,0 +1,42 @@
+import random
+
+from services.threshold_eval import evaluate_forecast_batch, evaluate_forecast_point
+
+
+def test_batch_matches_point_evaluation():
+    rng = random.Random(3)
+
+    def maybe(value):
+        return None if rng.random() < 0.1 else value
+
+    points = [
+        {
+            "temp": maybe(rng.uniform(-5, 35)),
+            "wind_speed": maybe(rng.uniform(0, 20)),
+            "rain": maybe(rng.uniform(0, 5)),
+            "uvi": maybe(rng.uniform(0, 11)),
+        }
+        for _ in range(12)
+    ]
+    limits_list = [
+        {
+            "min_temperature": rng.uniform(-5, 10),
+            "max_temperature": rng.uniform(20, 30),
+            "max_wind_speed": rng.uniform(3, 15),
+            "max_rain_intensity": rng.uniform(0, 3),
+            **({"max_uv_index": rng.uniform(3, 9)} if rng.random() < 0.5 else {}),
+        }
+        for _ in range(20)
+    ]
+
+    batch = evaluate_forecast_batch(points, limits_list)
+
+    assert len(batch) == len(limits_list)
+    for limits, per_point in zip(limits_list, batch):
+        assert per_point == [evaluate_forecast_point(p, limits) for p in points]
+
+
+def test_batch_treats_unset_limits_as_absent():
+    out = evaluate_forecast_batch([{"uvi": 9.0}], [{"max_uv_index": None}])
+    assert out == [[[]]]
+    assert evaluate_forecast_batch([], [{}]) == [[]]
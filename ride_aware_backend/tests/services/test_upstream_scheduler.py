@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from services.upstream_scheduler import Priority, RateLimitScheduler, UpstreamShedError
+
+
+def test_burst_is_granted_without_waiting():
+    scheduler = RateLimitScheduler(rate_per_s=1, burst=3, max_queue=10)
+
+    async def run():
+        for _ in range(3):
+            await scheduler.acquire(Priority.INTERACTIVE)
+
+    asyncio.run(run())
+    lane = scheduler.stats()["lanes"]["interactive"]
+    assert lane["granted"] == 3
+    assert lane["wait_max_s"] == 0
+
+
+def test_higher_priority_waiters_are_served_first():
+    scheduler = RateLimitScheduler(rate_per_s=50, burst=1, max_queue=10)
+    order = []
+
+    async def take(priority):
+        await scheduler.acquire(priority)
+        order.append(priority)
+
+    async def run():
+        await scheduler.acquire(Priority.INTERACTIVE)
+        await asyncio.gather(
+            take(Priority.HISTORY), take(Priority.SAMPLING), take(Priority.ALERT)
+        )
+
+    asyncio.run(run())
+    assert order == [Priority.ALERT, Priority.SAMPLING, Priority.HISTORY]
+    assert scheduler.stats()["lanes"]["history"]["wait_total_s"] > 0
+
+
+def test_full_queue_sheds_lowest_priority():
+    scheduler = RateLimitScheduler(rate_per_s=50, burst=1, max_queue=1)
+
+    async def run():
+        await scheduler.acquire(Priority.INTERACTIVE)
+        history = asyncio.ensure_future(scheduler.acquire(Priority.HISTORY))
+        await asyncio.sleep(0)
+        alert = asyncio.ensure_future(scheduler.acquire(Priority.ALERT))
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamShedError):
+            await scheduler.acquire(Priority.SAMPLING)
+        with pytest.raises(UpstreamShedError):
+            await history
+        await alert
+
+    asyncio.run(run())
+    lanes = scheduler.stats()["lanes"]
+    assert lanes["history"]["shed"] == 1
+    assert lanes["sampling"]["shed"] == 1
+    assert lanes["alert"]["granted"] == 1
+
+
+def test_zero_queue_sheds_instead_of_waiting():
+    scheduler = RateLimitScheduler(rate_per_s=0.001, burst=1, max_queue=0)
+
+    async def run():
+        await scheduler.acquire(Priority.INTERACTIVE)
+        with pytest.raises(UpstreamShedError):
+            await asyncio.wait_for(scheduler.acquire(Priority.ALERT), 1)
+
+    asyncio.run(run())
+    assert scheduler.stats()["lanes"]["alert"]["shed"] == 1
+
+
+@pytest.mark.parametrize(
+    "rate, burst, queue", [(1, 0, 10), (0, 1, 10), (-1, 1, 10), (1, 1, -1)]
+)
+def test_settings_that_could_never_grant_are_rejected(rate, burst, queue):
+    with pytest.raises(ValueError):
+        RateLimitScheduler(rate_per_s=rate, burst=burst, max_queue=queue)
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from services import weather_providers, weather_service
+from services.weather_providers import (
+    FileRecordStore,
+    RecordingProvider,
+    ReplayMissError,
+    ReplayProvider,
+    SyntheticProvider,
+)
+
+
+def test_synthetic_provider_is_deterministic():
+    clock = lambda: 1_700_000_000
+    a = SyntheticProvider(seed=7, clock=clock)
+    b = SyntheticProvider(seed=7, clock=clock)
+    c = SyntheticProvider(seed=8, clock=clock)
+
+    first = asyncio.run(a.fetch_forecast(51.5, -0.12, 40))
+    assert first == asyncio.run(b.fetch_forecast(51.5, -0.12, 40))
+    assert first != asyncio.run(c.fetch_forecast(51.5, -0.12, 40))
+    assert len(first) == 40
+    assert first[1]["dt"] - first[0]["dt"] == 3 * 3600
+    assert {"main", "wind", "clouds"} <= set(first[0])
+
+
+def test_record_then_replay_from_files(tmp_path):
+    store = FileRecordStore(str(tmp_path))
+    recorder = RecordingProvider(SyntheticProvider(seed=1), store)
+    recorded = asyncio.run(recorder.fetch_forecast(1.0, 2.0, 40))
+    current = asyncio.run(recorder.fetch_current(1.0, 2.0))
+
+    replay = ReplayProvider(FileRecordStore(str(tmp_path)))
+    assert asyncio.run(replay.fetch_forecast(1.0, 2.0, 40)) == recorded
+    assert asyncio.run(replay.fetch_current(1.0, 2.0)) == current
+    with pytest.raises(ReplayMissError):
+        asyncio.run(replay.fetch_forecast(3.0, 4.0, 40))
+
+
+def test_weather_service_runs_offline_on_synthetic_provider(monkeypatch):
+    provider = SyntheticProvider(seed=3, latency_s=0.01)
+    weather_providers.set_weather_provider(provider)
+    monkeypatch.setattr(weather_service, "load_forecast_run", _none)
+    monkeypatch.setattr(weather_service, "save_forecast_run", _none)
+    weather_service._forecast_cache.clear()
+    try:
+        res = asyncio.run(weather_service.get_hourly_forecast(1.0, 2.0, datetime.now()))
+    finally:
+        weather_providers.set_weather_provider(None)
+        weather_service._forecast_cache.clear()
+    assert res["temp"] is not None
+    assert provider.calls == 1
+
+
+async def _none(*args, **kwargs):
+    return None
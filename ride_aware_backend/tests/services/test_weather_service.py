@@ -1,18 +1,47 @@
+import asyncio
+import time
 from datetime import datetime
+from unittest.mock import AsyncMock
+import httpx
 import pytest
 
-from services import weather_service
+from services import weather_service, weather_providers
+from services.forecast_series import ForecastSeries
+from services.upstream_scheduler import RateLimitScheduler
+from utils.circuit_breaker import CircuitBreaker
 
 
-def make_response(data):
-    class Resp:
-        def __init__(self, d):
-            self._d = d
-        def json(self):
-            return self._d
-        def raise_for_status(self):
-            pass
-    return Resp(data)
+@pytest.fixture(autouse=True)
+def clear_forecast_cache(monkeypatch):
+    monkeypatch.setattr(weather_service, "load_forecast_run", AsyncMock(return_value=None))
+    monkeypatch.setattr(weather_service, "save_forecast_run", AsyncMock())
+    monkeypatch.setattr(
+        weather_service,
+        "weather_scheduler",
+        RateLimitScheduler(rate_per_s=1000, burst=1000, max_queue=1000),
+    )
+    monkeypatch.setattr(
+        weather_service, "_forecast_breaker", CircuitBreaker("test", 3, 60)
+    )
+    weather_service._forecast_cache.clear()
+    weather_providers.set_weather_provider(weather_providers.OpenWeatherProvider())
+    yield
+    weather_providers.set_weather_provider(None)
+    weather_service._forecast_cache.clear()
+
+
+def use_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(weather_providers, "get_http_client", lambda: client)
+
+
+def json_handler(data, captured=None):
+    def handler(request):
+        if captured is not None:
+            captured["url"] = str(request.url.copy_with(query=None))
+            captured["params"] = dict(request.url.params)
+        return httpx.Response(200, json=data)
+    return handler
 
 
 def test_get_hourly_forecast(monkeypatch):
@@ -22,21 +51,16 @@ def test_get_hourly_forecast(monkeypatch):
     monkeypatch.delenv("OPENWEATHER_URL", raising=False)
     captured = {}
 
-    def fake_get(url, params=None):
-        captured["url"] = url
-        captured["params"] = params
-        return make_response({"list": forecast_list})
-
-    monkeypatch.setattr(weather_service.requests, "get", fake_get)
-    res = weather_service.get_hourly_forecast(1.0, 2.0, dt)
+    use_transport(monkeypatch, json_handler({"list": forecast_list}, captured))
+    res = asyncio.run(weather_service.get_hourly_forecast(1.0, 2.0, dt))
     assert res["wind_speed"] == 5
     assert captured["url"] == "https://api.openweathermap.org/data/2.5/forecast"
     assert captured["params"] == {
-        "lat": 1.0,
-        "lon": 2.0,
+        "lat": "1.0",
+        "lon": "2.0",
         "appid": "key",
         "units": "metric",
-        "cnt": 8,
+        "cnt": "40",
     }
 
 
@@ -44,20 +68,24 @@ def test_get_hourly_forecast_no_data(monkeypatch):
     dt = datetime(2023, 1, 1, 12, 0)
     monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
     monkeypatch.delenv("OPENWEATHER_URL", raising=False)
-    monkeypatch.setattr(
-        weather_service.requests,
-        "get",
-        lambda url, params=None: make_response({"list": []}),
-    )
+    use_transport(monkeypatch, json_handler({"list": []}))
     with pytest.raises(ValueError):
-        weather_service.get_hourly_forecast(1.0, 2.0, dt)
+        asyncio.run(weather_service.get_hourly_forecast(1.0, 2.0, dt))
+
+
+def test_get_hourly_forecast_upstream_error(monkeypatch):
+    dt = datetime(2023, 1, 1, 12, 0)
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    use_transport(monkeypatch, lambda request: httpx.Response(502))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(weather_service.get_hourly_forecast(1.0, 2.0, dt))
 
 
 def test_get_hourly_forecast_missing_api_key(monkeypatch):
     dt = datetime(2023, 1, 1, 12, 0)
     monkeypatch.delenv("OPENWEATHER_API_KEY", raising=False)
     with pytest.raises(weather_service.MissingAPIKeyError):
-        weather_service.get_hourly_forecast(1.0, 2.0, dt)
+        asyncio.run(weather_service.get_hourly_forecast(1.0, 2.0, dt))
 
 
 def test_get_next_hours_forecast(monkeypatch):
@@ -65,23 +93,230 @@ def test_get_next_hours_forecast(monkeypatch):
     monkeypatch.delenv("OPENWEATHER_URL", raising=False)
     captured = {}
 
-    def fake_get(url, params=None):
-        captured["params"] = params
-        return make_response(
+    slot = int(datetime.now().timestamp())
+    data = {
+        "list": [
             {
-                "list": [
-                    {
-                        "dt": 1,
-                        "wind": {"speed": 2, "deg": 90},
-                        "main": {"temp": 10, "humidity": 50},
-                        "rain": {"3h": 0.1},
-                    }
-                ]
+                "dt": slot,
+                "wind": {"speed": 2, "deg": 90},
+                "main": {"temp": 10, "humidity": 50},
+                "rain": {"3h": 0.1},
             }
-        )
-
-    monkeypatch.setattr(weather_service.requests, "get", fake_get)
-    res = weather_service.get_next_hours_forecast(1.0, 2.0, 1)
+        ]
+    }
+    use_transport(monkeypatch, json_handler(data, captured))
+    res = asyncio.run(weather_service.get_next_hours_forecast(1.0, 2.0, 1))
     assert len(res) == 1
     assert res[0]["temp"] == 10
-    assert captured["params"]["cnt"] == 1
+    assert captured["params"]["cnt"] == "40"
+
+
+def test_forecasts_in_same_cell_share_one_fetch(monkeypatch):
+    dt = datetime.now()
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    calls = []
+
+    def handler(request):
+        calls.append(dict(request.url.params))
+        return httpx.Response(
+            200, json={"list": [{"dt": int(dt.timestamp()), "main": {"temp": 7}}]}
+        )
+
+    use_transport(monkeypatch, handler)
+
+    async def run():
+        first = await weather_service.get_hourly_forecast(51.501, -0.141, dt)
+        second = await weather_service.get_hourly_forecast(51.5012, -0.1412, dt)
+        hours = await weather_service.get_next_hours_forecast(51.5009, -0.1409, 1)
+        return first, second, hours
+
+    first, second, hours = asyncio.run(run())
+    assert first == second
+    assert hours[0]["temp"] == 7
+    assert len(calls) == 1
+    assert calls[0]["lat"] == "51.5"
+    assert calls[0]["lon"] == "-0.14"
+    stats = weather_service.forecast_stats()["cache"]
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_concurrent_misses_share_one_upstream_fetch(monkeypatch):
+    dt = datetime(2023, 1, 1, 12, 0)
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(
+            200, json={"list": [{"dt": int(dt.timestamp()), "main": {"temp": 3}}]}
+        )
+
+    use_transport(monkeypatch, handler)
+
+    async def run():
+        return await asyncio.gather(
+            *(weather_service.get_hourly_forecast(10.0, 20.0, dt) for _ in range(25))
+        )
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r["temp"] == 3 for r in results)
+    flight = weather_service.forecast_stats()["single_flight"]
+    assert flight["coalesced"] == 24
+
+
+def test_forecast_store_is_checked_before_upstream(monkeypatch):
+    dt = datetime(2023, 1, 1, 12, 0)
+    stored = [{"dt": int(dt.timestamp()), "temp": 11, "wind_speed": 4}]
+    load = AsyncMock(return_value={"forecasts": stored, "fetched_at": None})
+    monkeypatch.setattr(weather_service, "load_forecast_run", load)
+
+    def handler(request):
+        raise AssertionError("upstream should not be called")
+
+    use_transport(monkeypatch, handler)
+    res = asyncio.run(weather_service.get_hourly_forecast(1.0, 2.0, dt))
+    assert res["temp"] == 11
+    assert res["wind_speed"] == 4
+    assert res["rain"] is None
+    load.assert_awaited_once()
+    weather_service.save_forecast_run.assert_not_awaited()
+
+
+def test_fetched_series_is_saved_to_store(monkeypatch):
+    dt = datetime(2023, 1, 1, 12, 0)
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    use_transport(
+        monkeypatch,
+        json_handler({"list": [{"dt": int(dt.timestamp()), "main": {"temp": 5}}]}),
+    )
+    asyncio.run(weather_service.get_hourly_forecast(1.0, 2.0, dt))
+    save = weather_service.save_forecast_run
+    save.assert_awaited_once()
+    cell, lat, lon, run, slots, series, expires_at, _ = save.call_args.args
+    assert cell == (100, 200)
+    assert (lat, lon) == (1.0, 2.0)
+    assert series[0]["temp"] == 5
+    assert expires_at > run
+
+
+def test_target_times_are_interpolated_across_five_days(monkeypatch):
+    base = int(datetime(2024, 3, 1, 0, 0).timestamp())
+    forecast_list = [
+        {
+            "dt": base + i * 3 * 3600,
+            "main": {"temp": float(i)},
+            "wind": {"speed": 2.0, "deg": 350 if i % 2 == 0 else 10},
+        }
+        for i in range(40)
+    ]
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    use_transport(monkeypatch, json_handler({"list": forecast_list}))
+
+    targets = [
+        datetime.fromtimestamp(base + 90 * 60),
+        datetime.fromtimestamp(base + 4 * 24 * 3600),
+        datetime.fromtimestamp(base + 30 * 24 * 3600),
+    ]
+    mid, day_four, beyond = asyncio.run(
+        weather_service.get_forecasts_at(1.0, 2.0, targets)
+    )
+    assert mid["temp"] == pytest.approx(0.5)
+    assert min(mid["wind_deg"], 360 - mid["wind_deg"]) == pytest.approx(0, abs=1e-6)
+    assert mid["rain"] is None
+    assert day_four["temp"] == pytest.approx(32.0)
+    assert beyond["temp"] == pytest.approx(39.0)
+
+
+def _expired_series(dt, temp, age_s=600):
+    series = ForecastSeries.from_records(
+        [{"dt": int(dt.timestamp()), "temp": temp}], fetched_at=time.time() - age_s
+    )
+    weather_service._forecast_cache.set((100, 200), series, expires_at=time.time() - 1)
+
+
+def test_expired_forecast_is_served_stale_while_refreshing(monkeypatch):
+    dt = datetime.now()
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    _expired_series(dt, temp=1)
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(
+            200, json={"list": [{"dt": int(dt.timestamp()), "main": {"temp": 2}}]}
+        )
+
+    use_transport(monkeypatch, handler)
+
+    async def run():
+        first = await weather_service.get_hourly_forecast(1.0, 2.0, dt)
+        await asyncio.gather(*weather_service._background_refreshes)
+        second = await weather_service.get_hourly_forecast(1.0, 2.0, dt)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first["temp"] == 1
+    assert first["stale"] is True
+    assert first["forecast_age_s"] >= 600
+    assert second["temp"] == 2
+    assert "stale" not in second
+    assert len(calls) == 1
+
+
+def test_failed_refresh_falls_back_to_stale(monkeypatch):
+    dt = datetime.now()
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    monkeypatch.setattr(weather_service, "FORECAST_MAX_STALE_S", 0)
+    _expired_series(dt, temp=4)
+    use_transport(monkeypatch, lambda request: httpx.Response(503))
+
+    res = asyncio.run(weather_service.get_hourly_forecast(1.0, 2.0, dt))
+    assert res["temp"] == 4
+    assert res["stale"] is True
+
+
+def test_shed_refresh_falls_back_to_stale(monkeypatch):
+    dt = datetime.now()
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    monkeypatch.setattr(weather_service, "FORECAST_MAX_STALE_S", 0)
+    scheduler = RateLimitScheduler(rate_per_s=0.001, burst=1, max_queue=0)
+    monkeypatch.setattr(weather_service, "weather_scheduler", scheduler)
+    _expired_series(dt, temp=4)
+    use_transport(monkeypatch, lambda request: httpx.Response(503))
+
+    async def run():
+        # Use up the only token so the refresh is shed.
+        await scheduler.acquire()
+        return await weather_service.get_hourly_forecast(1.0, 2.0, dt)
+
+    res = asyncio.run(run())
+    assert res["temp"] == 4
+    assert res["stale"] is True
+    assert scheduler.stats()["lanes"]["interactive"]["shed"] == 1
+
+
+def test_breaker_opens_after_repeated_upstream_failures(monkeypatch):
+    dt = datetime.now()
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "key")
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    use_transport(monkeypatch, handler)
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await weather_service.get_hourly_forecast(1.0, 2.0, dt)
+        with pytest.raises(weather_service.ForecastUnavailableError):
+            await weather_service.get_hourly_forecast(1.0, 2.0, dt)
+
+    asyncio.run(run())
+    assert len(calls) == 3
+    assert weather_service.forecast_stats()["breaker"]["state"] == "open"
@@ -0,0 +1,242 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from models.wind import Coordinate, RouteRequest
+from services import wind_service
+
+
+def test_winds_are_sampled_concurrently_in_route_order(monkeypatch):
+    in_flight = 0
+    peak = 0
+
+    async def fake_wind(lat, lon):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        # Later points answer first.
+        await asyncio.sleep(0.05 - (lat - 51.0))
+        in_flight -= 1
+        return round((lat - 51.0) * 1000)
+
+    monkeypatch.setattr(wind_service, "get_wind_direction", fake_wind)
+
+    started = time.perf_counter()
+    lats = [51.0 + i * 0.01 for i in range(12)]
+    winds = asyncio.run(wind_service._sample_winds(lats, [-0.1] * 12, concurrency=4))
+
+    assert winds == list(range(0, 120, 10))
+    assert peak == 4
+    assert time.perf_counter() - started < 0.5
+
+
+def test_samples_past_the_deadline_are_none(monkeypatch):
+    async def fake_wind(lat, lon):
+        if lat > 51.015:
+            await asyncio.sleep(1)
+        return 90.0
+
+    monkeypatch.setattr(wind_service, "get_wind_direction", fake_wind)
+
+    lats = [51.0 + i * 0.01 for i in range(4)]
+    winds = asyncio.run(wind_service._sample_winds(lats, [-0.1] * 4, deadline_s=0.1))
+
+    assert winds == [90.0, 90.0, None, None]
+
+
+def test_compute_wind_directions_skips_failed_samples(monkeypatch):
+    async def fake_wind(lat, lon):
+        return None if lat < 51.015 else 180.0
+
+    queued = []
+
+    monkeypatch.setattr(wind_service, "get_wind_direction", fake_wind)
+    monkeypatch.setattr(wind_service.wind_record_writer, "add", queued.append)
+    # ~2.8 km north: samples at 1 km and 2 km, plus the end point.
+    req = RouteRequest(
+        points=[
+            Coordinate(lat=51.0, lon=-0.1),
+            Coordinate(lat=51.01, lon=-0.1),
+            Coordinate(lat=51.025, lon=-0.1),
+        ]
+    )
+
+    results = asyncio.run(wind_service.compute_wind_directions(req))
+
+    assert len(results) == 2
+    assert results[0].lat < results[1].lat == 51.025
+    assert len(queued) == 1
+
+
+def _random_trace(rng: random.Random):
+    n = rng.randint(0, 300)
+    lat, lon = rng.uniform(-60, 60), rng.uniform(-179, 179)
+    points = []
+    for _ in range(n):
+        # Occasional repeated fixes give zero-length segments.
+        if rng.random() > 0.1:
+            lat += rng.uniform(-0.003, 0.003)
+            lon += rng.uniform(-0.003, 0.003)
+        points.append(Coordinate(lat=lat, lon=lon))
+    return points
+
+
+def test_sample_route_arrays_matches_the_segment_walk():
+    rng = random.Random(1234)
+    for _ in range(200):
+        points = _random_trace(rng)
+        expected = wind_service.sample_route_points(points)
+
+        lat, lon = wind_service.sample_route_arrays(
+            [p.lat for p in points], [p.lon for p in points]
+        )
+
+        assert len(lat) == len(expected)
+        assert lat.tolist() == pytest.approx([c.lat for c in expected], abs=1e-9)
+        assert lon.tolist() == pytest.approx([c.lon for c in expected], abs=1e-9)
+
+
+def test_sample_route_arrays_spacing():
+    lats = [51.0 + i * 0.001 for i in range(101)]
+    lat, _ = wind_service.sample_route_arrays(lats, [0.0] * 101, spacing_m=250)
+    # ~11.1 km at 250 m spacing.
+    assert len(lat) == 44
+
+
+def test_wind_is_cached_per_grid_cell(monkeypatch):
+    calls = []
+
+    async def fake_fetch(lat, lon):
+        calls.append((lat, lon))
+        await asyncio.sleep(0.01)
+        return None if lat > 52 else 45.0
+
+    monkeypatch.setattr(wind_service, "_fetch_wind_direction", fake_fetch)
+    monkeypatch.setattr(wind_service, "_wind_cache", wind_service.TTLCache(16, ttl=60))
+
+    async def run():
+        # Three lookups in one cell at once, then a repeat, then a failure twice.
+        first = await asyncio.gather(
+            *(wind_service.get_wind_direction(51.5001 + i * 1e-4, -0.1) for i in range(3))
+        )
+        repeat = await wind_service.get_wind_direction(51.5002, -0.1001)
+        failed = [await wind_service.get_wind_direction(52.5, -0.1) for _ in range(2)]
+        return first, repeat, failed
+
+    first, repeat, failed = asyncio.run(run())
+
+    assert first == [45.0] * 3 and repeat == 45.0
+    assert failed == [None, None]
+    assert calls == [(51.5, -0.1), (52.5, -0.1), (52.5, -0.1)]
+    stats = wind_service.wind_stats()["cache"]
+    assert stats["hits"] == 1
+
+
+class _Routes:
+    def __init__(self):
+        self.ops = []
+
+    async def bulk_write(self, ops, ordered):
+        self.ops.extend(ops)
+
+
+class _Records:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, docs, ordered):
+        self.docs.extend(docs)
+
+
+def test_wind_records_reference_the_route_by_hash(monkeypatch):
+    async def fake_wind(lat, lon):
+        return 90.0
+
+    queued = []
+    monkeypatch.setattr(wind_service, "get_wind_direction", fake_wind)
+    monkeypatch.setattr(wind_service.wind_record_writer, "add", queued.append)
+    monkeypatch.setattr(wind_service, "_known_routes", wind_service.TTLCache(16, ttl=60))
+    monkeypatch.setattr(wind_service, "wind_routes_collection", _Routes())
+    monkeypatch.setattr(wind_service, "wind_directions_collection", _Records())
+    req = RouteRequest(
+        points=[Coordinate(lat=51.0, lon=-0.1), Coordinate(lat=51.02, lon=-0.1)]
+    )
+
+    asyncio.run(wind_service.compute_wind_directions(req))
+    asyncio.run(wind_service._flush_wind_records(list(queued)))
+    asyncio.run(wind_service.compute_wind_directions(req))
+
+    (first, route), (second, repeat) = queued
+    assert first["route_hash"] == second["route_hash"]
+    assert "route_points" not in first
+    assert route == [{"lat": 51.0, "lon": -0.1}, {"lat": 51.02, "lon": -0.1}]
+    assert repeat is None
+
+
+def test_route_points_are_resent_until_a_record_is_written(monkeypatch):
+    async def fake_wind(lat, lon):
+        return 90.0
+
+    queued = []
+    monkeypatch.setattr(wind_service, "get_wind_direction", fake_wind)
+    monkeypatch.setattr(wind_service.wind_record_writer, "add", queued.append)
+    monkeypatch.setattr(wind_service, "_known_routes", wind_service.TTLCache(16, ttl=60))
+    req = RouteRequest(
+        points=[Coordinate(lat=51.0, lon=-0.1), Coordinate(lat=51.02, lon=-0.1)]
+    )
+
+    # The first record is dropped from the buffer before it is written.
+    asyncio.run(wind_service.compute_wind_directions(req))
+    asyncio.run(wind_service.compute_wind_directions(req))
+
+    (_, first), (_, second) = queued
+    assert first == second and second is not None
+
+
+def test_flush_upserts_each_route_once(monkeypatch):
+    routes, records = _Routes(), _Records()
+    monkeypatch.setattr(wind_service, "wind_routes_collection", routes)
+    monkeypatch.setattr(wind_service, "wind_directions_collection", records)
+    monkeypatch.setattr(wind_service, "_known_routes", wind_service.TTLCache(16, ttl=60))
+    points = [{"lat": 51.0, "lon": -0.1}]
+    batch = [
+        ({"route_hash": "a"}, points),
+        ({"route_hash": "a"}, None),
+        ({"route_hash": "b"}, points),
+    ]
+
+    asyncio.run(wind_service._flush_wind_records(batch))
+
+    assert len(routes.ops) == 2
+    assert [d["route_hash"] for d in records.docs] == ["a", "a", "b"]
+    assert wind_service._known_routes.get("a") and wind_service._known_routes.get("b")
+
+
+def test_saved_route_uses_the_simplified_polyline(monkeypatch):
+    from services.route_geometry import build_route_summary
+
+    # A straight 2 km line with jittery points in between.
+    points = [
+        {"latitude": 51.0 + i * 0.0009, "longitude": (-1) ** i * 0.000005}
+        for i in range(21)
+    ]
+    summary = build_route_summary(points, spacing_m=1000, simplify_tolerance_m=5)
+    projections = []
+
+    class Routes:
+        async def find_one(self, query, projection):
+            projections.append(projection)
+            return {"geometry": summary}
+
+    monkeypatch.setattr(wind_service, "routes_collection", Routes())
+
+    route_lat, route_lon, sample_lat, _ = asyncio.run(
+        wind_service._saved_route_samples("device123", 1000)
+    )
+
+    assert projections == [{"geometry": 1}]
+    assert len(route_lat) == len(summary["simplified_points"]) < len(points)
+    assert route_lat[-1] == points[-1]["latitude"]
+    assert len(sample_lat) == 2
@@ -0,0 +1,61 @@
+import asyncio
+
+from utils.batch_writer import BatchWriter
+
+
+def test_full_batches_flush_without_waiting_for_the_interval():
+    flushed = []
+
+    async def flush(batch):
+        flushed.append(list(batch))
+
+    async def run():
+        writer = BatchWriter("test", flush, max_batch=3, flush_interval_s=60)
+        writer.start()
+        for i in range(7):
+            writer.add(i)
+        await asyncio.sleep(0.01)
+        assert flushed == [[0, 1, 2], [3, 4, 5], [6]]
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["written"] == 7
+    assert stats["pending"] == 0
+
+
+def test_interval_flush_and_final_flush_on_stop():
+    flushed = []
+
+    async def flush(batch):
+        flushed.append(list(batch))
+
+    async def run():
+        writer = BatchWriter("test", flush, max_batch=10, flush_interval_s=0.02)
+        writer.start()
+        writer.add("a")
+        await asyncio.sleep(0.05)
+        assert flushed == [["a"]]
+        writer.add("b")
+        await writer.stop()
+
+    asyncio.run(run())
+    assert flushed == [["a"], ["b"]]
+
+
+def test_overflow_drops_oldest_and_failures_are_counted():
+    async def flush(batch):
+        raise RuntimeError("db down")
+
+    async def run():
+        writer = BatchWriter("test", flush, max_batch=2, flush_interval_s=60, max_pending=3)
+        for i in range(5):
+            writer.add(i)
+        assert list(writer._pending) == [2, 3, 4]
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["dropped"] == 2
+    assert stats["failed"] == 3
+    assert stats["written"] == 0
@@ -0,0 +1,54 @@
+import asyncio
+
+from utils.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_result():
+    flight = SingleFlight()
+    executions = []
+
+    async def fetch():
+        executions.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", fetch) for _ in range(10)))
+
+    assert asyncio.run(run()) == ["value"] * 10
+    assert len(executions) == 1
+    assert flight.stats()["coalesced"] == 9
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_concurrent_callers_share_error():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(
+            *(flight.do("k", fetch) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["executions"] == 1
+    assert flight.stats()["errors"] == 1
+
+
+def test_sequential_calls_execute_again():
+    flight = SingleFlight()
+
+    async def fetch():
+        return 1
+
+    async def run():
+        await flight.do("k", fetch)
+        await flight.do("k", fetch)
+
+    asyncio.run(run())
+    assert flight.stats()["executions"] == 2
+    assert flight.stats()["coalesced"] == 0
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Buffer items in memory and hand them to ``flush_fn`` in batches.
+
+    A background loop flushes whenever ``max_batch`` items are waiting or
+    ``flush_interval_s`` has passed. The buffer holds at most ``max_pending``
+    items; beyond that the oldest are dropped, so a slow or unreachable
+    database costs data rather than memory. ``stop`` flushes what is left.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush_fn: Callable[[List[Any]], Awaitable[None]],
+        max_batch: int,
+        flush_interval_s: float,
+        max_pending: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self._flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self.max_pending = max_pending or max_batch * 10
+        self._pending: Deque[Any] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def add(self, item: Any) -> None:
+        self._pending.append(item)
+        if len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        if len(self._pending) >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._pending:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch = [
+            self._pending.popleft()
+            for _ in range(min(self.max_batch, len(self._pending)))
+        ]
+        self.flushes += 1
+        try:
+            await self._flush_fn(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning("%s: failed to flush %s items: %s", self.name, len(batch), e)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+GridCell = Tuple[int, int]
+
+
+def grid_cell(lat: float, lon: float, step_deg: float) -> GridCell:
+    """Snap a coordinate to the nearest node of a ``step_deg`` lat/lon grid."""
+    return (round(float(lat) / step_deg), round(float(lon) / step_deg))
+
+
+def cell_center(cell: GridCell, step_deg: float) -> Tuple[float, float]:
+    return (round(cell[0] * step_deg, 6), round(cell[1] * step_deg, 6))
+
+
+def cell_key(cell: GridCell) -> str:
+    return f"{cell[0]}:{cell[1]}"
+
+
+def forecast_run(now: datetime, run_hours: int) -> datetime:
+    """Start of the provider forecast run that is current at ``now`` (UTC)."""
+    now = now.astimezone(timezone.utc) if now.tzinfo else now.replace(tzinfo=timezone.utc)
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day + timedelta(hours=(now.hour // run_hours) * run_hours)
+
+
+def next_forecast_run(now: datetime, run_hours: int) -> datetime:
+    return forecast_run(now, run_hours) + timedelta(hours=run_hours)